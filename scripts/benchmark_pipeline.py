@@ -0,0 +1,371 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import contextlib
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from mesh_io import read_ply, write_ply
+from synthetic_dataset import generate_dataset, make_blob_mesh, make_cloud, LocalS3Client
+from download_moad import MOADv2_Downloader
+from create_urdf_files import create_urdf_files
+from stage_metrics import load_stage_records, summarize_stages
+from pointcloud_cache import benchmark_cases, peak_traced_mb
+import build_assembly_scene
+
+SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
+
+# Every data type enabled, so the download benchmark touches the full object layout
+FULL_DATA_CONFIG = {
+    "rgb": True,
+    "pose_reconstruction": True,
+    "realsense": True,
+    "cad_model": True,
+    "fused_model": {
+        "raw_cloud": True,
+        "raw_mesh": True,
+        "obj_mesh": True,
+        "usd_mesh": True,
+        "blender_file": True
+    }
+}
+
+
+class BenchmarkDownloader(MOADv2_Downloader):
+    """MOADv2_Downloader which talks to a LocalS3Client instead of the real bucket."""
+    def __init__(self, config, object_list, s3_client):
+        self._s3_client = s3_client
+        super().__init__(config, object_list)
+
+    def start_s3_client(self):
+        self.s3 = self._s3_client
+
+
+def summarize(times):
+    """Summary statistics (seconds) for a list of timings."""
+    times = np.asarray(times, dtype=np.float64)
+    return {
+        "repeats": int(len(times)),
+        "min_s": float(times.min()),
+        "mean_s": float(times.mean()),
+        "median_s": float(np.median(times)),
+        "p95_s": float(np.percentile(times, 95)),
+        "max_s": float(times.max()),
+    }
+
+
+def timed(fn, repeats):
+    """Run `fn` `repeats` times (stdout suppressed), returning (list of seconds, last result)."""
+    times = []
+    result = None
+    for _ in range(repeats):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+    return times, result
+
+
+def dir_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(dirpath, f)) for f in filenames)
+    return total
+
+
+# =======================
+# Benchmarks
+# =======================
+def bench_listing(downloader, objects, repeats):
+    """Latency of the listing calls the downloader makes for each object."""
+    client = downloader.s3
+    results = {}
+
+    def list_all_keys():
+        keys = []
+        for o in objects:
+            for page in client.get_paginator("list_objects_v2").paginate(Bucket=downloader.bucket_name, Prefix=f"{o}/"):
+                keys.extend(page.get("Contents", []))
+        return keys
+
+    for name, fn in (("folder_exists", lambda: [downloader.folder_exists(o) for o in objects]),
+                     ("list_pose_folders", lambda: [downloader.list_pose_folders(f"{o}/") for o in objects]),
+                     ("list_all_keys", list_all_keys)):
+        times, _ = timed(fn, repeats)
+        results[name] = summarize([t / len(objects) for t in times])
+        results[name]["unit"] = "per object"
+    return results
+
+
+def bench_download(client, objects, work_dir, concurrency_levels, repeats):
+    """Download throughput of the full object set at several concurrency levels."""
+    keys = []
+    for o in objects:
+        for page in client.get_paginator("list_objects_v2").paginate(Bucket="moadv2", Prefix=f"{o}/"):
+            keys.extend((c["Key"], c["Size"]) for c in page.get("Contents", []))
+    total_bytes = sum(size for _, size in keys)
+    results = {"files": len(keys), "bytes": total_bytes, "concurrency": {}}
+
+    target = os.path.join(work_dir, "download_target")
+    config = {"target_directory": target, "download_unsigned": True, "data_to_download": FULL_DATA_CONFIG}
+
+    for level in concurrency_levels:
+        times = []
+        for _ in range(repeats):
+            shutil.rmtree(target, ignore_errors=True)
+            with contextlib.redirect_stdout(io.StringIO()):
+                downloader = BenchmarkDownloader(config, objects, client)
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=level) as pool:
+                    list(pool.map(lambda k: downloader.download_file(k[0], os.path.join(target, k[0])), keys))
+                times.append(time.perf_counter() - start)
+        stats = summarize(times)
+        stats["mb_per_s"] = total_bytes / 1e6 / stats["median_s"]
+        stats["files_per_s"] = len(keys) / stats["median_s"]
+        results["concurrency"][str(level)] = stats
+
+    # End-to-end run of the real (sequential) download_objects code path
+    times = []
+    for _ in range(repeats):
+        shutil.rmtree(target, ignore_errors=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            downloader = BenchmarkDownloader(config, objects, client)
+            start = time.perf_counter()
+            downloader.download_objects()
+            times.append(time.perf_counter() - start)
+    stats = summarize(times)
+    stats["mb_per_s"] = dir_size(target) / 1e6 / stats["median_s"]
+    results["download_objects"] = stats
+    return results, target
+
+
+def bench_ply_parse(work_dir, cloud_sizes, mesh_sizes, repeats):
+    """PLY parse speed for synthetic clouds and meshes of several sizes."""
+    ply_dir = os.path.join(work_dir, "ply")
+    results = {"cloud": {}, "mesh": {}}
+    for n in cloud_sizes:
+        path = os.path.join(ply_dir, f"cloud_{n}.ply")
+        points, colors = make_cloud(n)
+        write_ply(path, points, colors)
+        times, _ = timed(lambda: read_ply(path), repeats)
+        stats = summarize(times)
+        stats["mb_per_s"] = os.path.getsize(path) / 1e6 / stats["median_s"]
+        stats["mpoints_per_s"] = n / 1e6 / stats["median_s"]
+        results["cloud"][str(n)] = stats
+    for n in mesh_sizes:
+        path = os.path.join(ply_dir, f"mesh_{n}.ply")
+        vertices, colors, faces = make_blob_mesh(n)
+        write_ply(path, vertices, colors, faces)
+        times, _ = timed(lambda: read_ply(path), repeats)
+        stats = summarize(times)
+        stats["mb_per_s"] = os.path.getsize(path) / 1e6 / stats["median_s"]
+        stats["faces"] = int(len(faces))
+        results["mesh"][str(n)] = stats
+    return results
+
+
+def bench_pointcloud_cache(work_dir, cloud_sizes, repeats):
+    """Plain PLY vs chunked point cloud cache, on the clouds written by bench_ply_parse."""
+    results = {}
+    for n in cloud_sizes:
+        path = os.path.join(work_dir, "ply", f"cloud_{n}.ply")
+        stats, timings, memory = benchmark_cases(path)
+        for name, fn in timings.items():
+            times, _ = timed(fn, repeats)
+            stats[name] = summarize(times)
+        # Memory is traced in separate runs so tracemalloc doesn't slow down the timings
+        for name, fn in memory.items():
+            stats[name]["peak_mb"] = peak_traced_mb(fn)
+        results[str(n)] = stats
+    return results
+
+
+def bench_blender(work_dir, blender_path, mesh_sizes):
+    """Wall time of blender_convert_ply.py (cleanup, decimation, bake, export) on synthetic meshes."""
+    script = os.path.join(SCRIPT_DIR, "blender_convert_ply.py")
+    results = {}
+    for n in mesh_sizes:
+        obj_name = f"bench_mesh-{n}"
+        fused_dir = os.path.join(work_dir, "blender", obj_name, "fused")
+        shutil.rmtree(os.path.dirname(fused_dir), ignore_errors=True)
+        mesh_path = os.path.join(fused_dir, f"{obj_name}_mesh.ply")
+        vertices, colors, faces = make_blob_mesh(n)
+        write_ply(mesh_path, vertices, colors, faces)
+        metrics_path = os.path.join(fused_dir, "stage_metrics.jsonl")
+        cmd = [blender_path, "--background", "--python", script, "--", mesh_path]
+        start = time.perf_counter()
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                env=dict(os.environ, MOAD_METRICS_PATH=metrics_path))
+        elapsed = time.perf_counter() - start
+        results[str(n)] = {"total_s": elapsed, "success": result.returncode == 0, "faces": int(len(faces)),
+                           "stages": summarize_stages(load_stage_records(metrics_path))}
+    return results
+
+
+def bench_urdf(target, repeats):
+    """URDF generation time over a downloaded object folder."""
+    times, created = timed(lambda: create_urdf_files(target), repeats)
+    stats = summarize(times)
+    stats["objects"] = len(created)
+    return stats
+
+
+def bench_scene_load(target, objects, work_dir, copies, repeats):
+    """PyBullet load time of an instanced assembly scene vs the per-object URDFs (needs pybullet)."""
+    placements = os.path.join(work_dir, "scene_placements.json")
+    instances = [{"object": o, "xyz": [i * 0.15, j * 0.15, 0.0]} for i, o in enumerate(objects) for j in range(copies)]
+    with open(placements, "w") as f:
+        json.dump({"instances": instances}, f)
+    with contextlib.redirect_stdout(io.StringIO()):
+        scene = build_assembly_scene.build_scene(target, "benchmark", objects, os.path.join(work_dir, "scene"), placements)
+    return build_assembly_scene.benchmark_load(scene, repeats)
+
+
+# =======================
+# Results
+# =======================
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=SCRIPT_DIR, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def flatten(d, prefix=""):
+    flat = {}
+    for k, v in d.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            flat.update(flatten(v, key + "."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            flat[key] = v
+    return flat
+
+
+def compare(current, baseline, threshold):
+    """
+    Print metrics that regressed by more than `threshold` (fraction) against a baseline results file.
+    Timings (median_s / total_s) are lower-is-better, throughputs (*_per_s) higher-is-better.
+
+    Returns:
+        list[str]: Descriptions of the regressions found.
+    """
+    cur, base = flatten(current["results"]), flatten(baseline["results"])
+    regressions = []
+    for key in sorted(cur.keys() & base.keys()):
+        old, new = base[key], cur[key]
+        if old == 0:
+            continue
+        change = (new - old) / old
+        if key.endswith(("median_s", "total_s")) and change > threshold:
+            regressions.append(f"{key}: {old:.4f}s -> {new:.4f}s ({change:+.1%})")
+        elif key.endswith("_per_s") and -change > threshold:
+            regressions.append(f"{key}: {old:.2f} -> {new:.2f} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MOADv2 download and conversion pipeline on a synthetic dataset.")
+    parser.add_argument("--work-dir", default="/tmp/moadv2_benchmark", help="Scratch directory for the synthetic bucket and downloads")
+    parser.add_argument("--output", default=None, help="Results JSON path (default: <work-dir>/benchmark_<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    parser.add_argument("--repeats", type=int, default=3)
+    # Synthetic dataset
+    parser.add_argument("--objects", type=int, default=3)
+    parser.add_argument("--poses", type=int, default=2)
+    parser.add_argument("--dslr-images", type=int, default=36)
+    parser.add_argument("--image-kb", type=int, default=256)
+    parser.add_argument("--realsense-clouds", type=int, default=36)
+    parser.add_argument("--realsense-points", type=int, default=2000)
+    parser.add_argument("--cloud-points", type=int, default=200000)
+    parser.add_argument("--mesh-faces", type=int, default=200000)
+    # Simulated network
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Simulated per-request latency")
+    parser.add_argument("--bandwidth-mbps", type=float, default=200.0, help="Simulated per-connection bandwidth (0 = unlimited)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    # Parse / conversion sizes
+    parser.add_argument("--ply-cloud-sizes", type=int, nargs="+", default=[100000, 1000000, 5000000])
+    parser.add_argument("--ply-mesh-sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--blender", default=None, help="Blender executable; enables the conversion benchmark")
+    parser.add_argument("--blender-mesh-sizes", type=int, nargs="+", default=[100000, 500000])
+    parser.add_argument("--scene-copies", type=int, default=10, help="Instances per object in the assembly scene load benchmark")
+    args = parser.parse_args()
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    bucket_root = os.path.join(args.work_dir, "bucket")
+    shutil.rmtree(bucket_root, ignore_errors=True)
+    print(f"Generating synthetic dataset in {bucket_root} ...")
+    poses = tuple(f"pose-{chr(ord('a') + i)}" for i in range(args.poses))
+    objects = generate_dataset(bucket_root, n_objects=args.objects, poses=poses, dslr_images=args.dslr_images,
+                               image_kb=args.image_kb, realsense_clouds=args.realsense_clouds,
+                               realsense_points=args.realsense_points, cloud_points=args.cloud_points,
+                               mesh_faces=args.mesh_faces)
+    client = LocalS3Client(bucket_root, latency=args.latency_ms / 1000.0, bandwidth_mbps=args.bandwidth_mbps or None)
+
+    results = {}
+    print("Benchmarking listing...")
+    with contextlib.redirect_stdout(io.StringIO()):
+        downloader = BenchmarkDownloader({"target_directory": os.path.join(args.work_dir, "download_target"),
+                                          "download_unsigned": True}, objects, client)
+    results["listing"] = bench_listing(downloader, objects, args.repeats)
+    print("Benchmarking downloads...")
+    results["download"], target = bench_download(client, objects, args.work_dir, args.concurrency, args.repeats)
+    print("Benchmarking PLY parsing...")
+    results["ply_parse"] = bench_ply_parse(args.work_dir, args.ply_cloud_sizes, args.ply_mesh_sizes, args.repeats)
+    print("Benchmarking point cloud cache...")
+    results["pointcloud_cache"] = bench_pointcloud_cache(args.work_dir, args.ply_cloud_sizes, args.repeats)
+    if args.blender:
+        if shutil.which(args.blender) or os.path.exists(args.blender):
+            print("Benchmarking Blender conversion...")
+            results["blender_convert"] = bench_blender(args.work_dir, args.blender, args.blender_mesh_sizes)
+        else:
+            print(f"Blender executable not found: {args.blender}, skipping conversion benchmark.")
+    print("Benchmarking URDF generation...")
+    results["urdf"] = bench_urdf(target, args.repeats)
+    if build_assembly_scene.pybullet is not None:
+        print("Benchmarking assembly scene loading...")
+        results["scene_load"] = bench_scene_load(target, objects, args.work_dir, args.scene_copies, args.repeats)
+    else:
+        print("pybullet not installed, skipping assembly scene load benchmark.")
+
+    report = {
+        "meta": metadata(),
+        "config": vars(args),
+        "results": results,
+    }
+    output = args.output or os.path.join(args.work_dir, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"\n📄 Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) vs {args.compare}:")
+            for r in regressions:
+                print(f"  - {r}")
+            sys.exit(1)
+        print(f"\n✅ No regressions vs {args.compare} (threshold {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,25 @@
 import os
 import re
-from pathlib import Path
+import csv
+import sys
+import json
 import time
+import argparse
 import subprocess
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from stage_metrics import load_stage_records, summarize_stages, print_stage_summary
+import cad_io
+from cad_io import CAD_EXTENSIONS, STEP_EXTENSIONS, tessellate_step
+
+# Path to blender executable
+# BLENDER_PATH = "/home/csrobot/software/blender-4.3.2-linux-x64/blender"
+BLENDER_PATH = "blender"
+# Path to the blender python script we already wrote
+CONVERSION_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "blender_convert_cad_to_usd.py")
+
 
 def find_files(root_dir: str, pattern: str, max_depth: int, ignore_case = False):
     """
@@ -37,49 +54,220 @@ def find_files(root_dir: str, pattern: str, max_depth: int, ignore_case = False)
     _walk(root_path, 0)
     return matches
 
-def run_blender(mesh_folder):
-    """Run Blender in background mode on one folder."""
+
+def find_cad_files(root, object_pattern=None):
+    """
+    CAD files (STL / STEP) in the `cad/` folder of every downloaded object under `root`,
+    i.e. `<root>/<object>/cad/*`. Our own outputs in `cad/converted/` are ignored.
+
+    Outputs are named after the file stem, so only one file per stem is kept: the STEP file
+    (the exact geometry) when it can be tessellated, otherwise the STL.
+
+    Returns:
+        list[tuple]: (object name, file path), sorted.
+    """
+    pattern = re.compile(object_pattern) if object_pattern else None
+    extensions = "|".join(re.escape(e) for e in CAD_EXTENSIONS)
+    files = []
+    for entry in sorted(os.scandir(root), key=lambda e: e.name):
+        cad_dir = os.path.join(entry.path, "cad")
+        if not entry.is_dir() or not os.path.isdir(cad_dir):
+            continue
+        if pattern and not pattern.match(entry.name):
+            continue
+        by_stem = {}
+        for path in sorted(find_files(cad_dir, rf"({extensions})$", 0, ignore_case=True)):
+            by_stem.setdefault(Path(path).stem, []).append(path)
+        for stem, paths in sorted(by_stem.items()):
+            chosen = sorted(paths, key=lambda p: _preference(p))[0]
+            for path in paths:
+                if path != chosen:
+                    print(f"⏭️ {entry.name}: using {os.path.basename(chosen)} instead of {os.path.basename(path)}")
+            files.append((entry.name, chosen))
+    return files
+
+
+def _preference(path):
+    """Sort key: STEP first when OpenCascade is available, STL first otherwise."""
+    is_step = Path(path).suffix.lower() in STEP_EXTENSIONS
+    return is_step != (cad_io.STEPControl_Reader is not None)
+
+
+def output_dir_for(cad_file):
+    return os.path.join(os.path.dirname(cad_file), "converted")
+
+
+def already_converted(cad_file):
+    stem = Path(cad_file).stem
+    return os.path.exists(os.path.join(output_dir_for(cad_file), f"{stem}_report.json"))
+
+
+def run_blender(cad_file, output_dir, log_path, metrics_path, scale=None, tolerance=1e-4, merge_distance=1e-6, threads=0):
+    """Run Blender in background mode on one CAD file, logging its output to `log_path`."""
     cmd = [
         BLENDER_PATH,
         "--background",
+        "--threads", str(threads),
         "--python", CONVERSION_SCRIPT,
-        "--", mesh_folder
+        "--", cad_file,
+        "--output-dir", output_dir,
+        "--tolerance", str(tolerance),
+        "--merge-distance", str(merge_distance),
     ]
-    print(f"\n🚀 Running Blender on {mesh_folder}")
+    if scale is not None:
+        cmd += ["--scale", str(scale)]
     start = time.time()
-    result = subprocess.run(cmd)
-    elapsed = time.time() - start
-    success = (result.returncode == 0)
-    if success:
-        print(f"✅ Completed in {elapsed:.2f} seconds")
-    else:
-        print(f"❌ Failed after {elapsed:.2f} seconds (exit code {result.returncode})")
-    return elapsed, success
+    with open(log_path, "w") as log:
+        result = subprocess.run(cmd, stdout=log, stderr=subprocess.STDOUT,
+                                env=dict(os.environ, MOAD_METRICS_PATH=metrics_path))
+    return time.time() - start, result.returncode == 0
 
 
-# Path to blender executable
-# BLENDER_PATH = "/home/csrobot/software/blender-4.3.2-linux-x64/blender"
-BLENDER_PATH = "blender"
-# Path to the blender python script we already wrote
-CONVERSION_SCRIPT = "/home/csrobot/moad_cui/scripts/blender_convert_cad_to_usd.py"
-if not os.path.exists(CONVERSION_SCRIPT):
-    print(f"ERROR: Conversion script file not found, set it at the top of this script.\n Current: {CONVERSION_SCRIPT}")
-    exit(1)
-
-# == ASSEMBLE LIST OF CAD FILE PATHS ==
-# Set root directory
-search_root = "/home/csrobot/Omniverse/Models/ATB1_download"
-max_search_depth = 5
-search_pattern =  r"\.(stl)$"
-# Search for '.stl' files
-file_list = find_files(search_root,search_pattern,max_search_depth)
-file_list = sorted(file_list)
-
-# Show matches, pause before continuing 
-print(f"Found {len(file_list)} matches:")
-for f in file_list: print(f" > {f}")
-input("Continue?:")
-
-# For each stl file, run blender conversion
-for cad_file in file_list:
-    run_blender(cad_file)
\ No newline at end of file
+def convert_file(object_name, cad_file, work_dir, scale, tolerance, merge_distance, threads):
+    """
+    Convert one CAD file: tessellate STEP to STL if needed, then run the Blender conversion.
+    Any error is recorded in the row (status "fail") rather than raised, so one bad file
+    doesn't abort the rest of the batch.
+
+    Returns:
+        dict: Result row (with the Blender report merged in when the conversion succeeded).
+    """
+    row = {"object": object_name, "file": os.path.basename(cad_file), "tessellate_s": 0.0, "blender_s": 0.0}
+    try:
+        _convert_file(row, object_name, cad_file, work_dir, scale, tolerance, merge_distance, threads)
+    except Exception as e:
+        row.update(status="fail", error=str(e))
+    return row
+
+
+def _convert_file(row, object_name, cad_file, work_dir, scale, tolerance, merge_distance, threads):
+    stem = Path(cad_file).stem
+    output_dir = output_dir_for(cad_file)
+    os.makedirs(output_dir, exist_ok=True)
+    mesh_file = cad_file
+    if Path(cad_file).suffix.lower() in STEP_EXTENSIONS:
+        # Split the deviation budget between tessellation and simplification,
+        # so the result stays within `tolerance` of the exact CAD surface
+        tessellation_tolerance = tolerance / 2 if tolerance > 0 else cad_io.DEFAULT_TESSELLATION_TOLERANCE
+        tolerance = tolerance / 2
+        row["tessellation_tolerance_m"] = tessellation_tolerance
+        # Keep the stem so the converted outputs are named after the STEP file
+        mesh_file = os.path.join(work_dir, "tessellated", object_name, f"{stem}.stl")
+        os.makedirs(os.path.dirname(mesh_file), exist_ok=True)
+        start = time.time()
+        _, scale = tessellate_step(cad_file, mesh_file, tessellation_tolerance)
+        row["tessellate_s"] = time.time() - start
+
+    log_path = os.path.join(work_dir, f"{object_name}_{stem}.log")
+    metrics_path = os.path.join(work_dir, f"{object_name}_{stem}.jsonl")
+    row.update(log=log_path, metrics=metrics_path, status="fail")
+    elapsed, success = run_blender(mesh_file, output_dir, log_path, metrics_path, scale, tolerance, merge_distance, threads)
+    row["blender_s"] = elapsed
+    report_path = os.path.join(output_dir, f"{stem}_report.json")
+    if success and os.path.exists(report_path):
+        with open(report_path, "r") as f:
+            row.update(json.load(f))
+        row["status"] = "success"
+
+
+def main(search_root, object_pattern=None, workers=None, scale=None, tolerance=1e-4, merge_distance=1e-6,
+         skip_existing=True, confirm=True):
+    if not os.path.exists(CONVERSION_SCRIPT):
+        print(f"ERROR: Conversion script file not found, set it at the top of this script.\n Current: {CONVERSION_SCRIPT}")
+        sys.exit(1)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    file_list = find_cad_files(search_root, object_pattern)
+
+    # Show matches, pause before continuing
+    print(f"Found {len(file_list)} matches:")
+    for _, f in file_list:
+        print(f" > {'[already converted] ' if already_converted(f) else ''}{f}")
+    if skip_existing:
+        file_list = [(o, f) for o, f in file_list if not already_converted(f)]
+    if not file_list:
+        print("Nothing to convert.")
+        return
+    if confirm:
+        input("Continue?:")
+
+    # Split the cores between concurrent Blender instances
+    workers = workers or max(1, (os.cpu_count() or 1) // 2)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    log_dir = os.path.join(search_root, "_blender_logs")
+    work_dir = os.path.join(log_dir, f"{timestamp}_cad")
+    os.makedirs(work_dir, exist_ok=True)
+    print(f"\n🚀 Converting {len(file_list)} files with {workers} Blender workers ({threads} threads each)")
+
+    rows = []
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(convert_file, o, f, work_dir, scale, tolerance, merge_distance, threads) for o, f in file_list]
+        for future in as_completed(futures):
+            row = future.result()
+            rows.append(row)
+            if row["status"] == "success":
+                print(f"✅ {row['object']}/{row['file']}: {row['triangles_in']} -> {row['triangles_out']} triangles "
+                      f"({row['reduction']:.0%} fewer) in {row['tessellate_s'] + row['blender_s']:.2f} s")
+            else:
+                print(f"❌ {row['object']}/{row['file']} failed: {row.get('error') or row.get('log')}")
+    total = time.time() - start
+    rows.sort(key=lambda r: (r["object"], r["file"]))
+
+    # Per-file CSV and full JSON report
+    csv_path = os.path.join(log_dir, f"{timestamp}_cad_report.csv")
+    with open(csv_path, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["Object", "File", "Status", "Unit", "Scale", "TrianglesIn", "TrianglesMerged", "TrianglesOut",
+                         "Reduction", "MaxDeviationM", "TessellateSeconds", "BlenderSeconds", "UsdBytes"])
+        for r in rows:
+            writer.writerow([r["object"], r["file"], r["status"], r.get("unit", ""), r.get("scale", ""),
+                             r.get("triangles_in", ""), r.get("triangles_merged", ""), r.get("triangles_out", ""),
+                             f"{r['reduction']:.4f}" if "reduction" in r else "",
+                             f"{r['max_deviation_m']:.6g}" if "max_deviation_m" in r else "",
+                             f"{r['tessellate_s']:.2f}", f"{r['blender_s']:.2f}", r.get("usd_bytes", "")])
+
+    stage_records = []
+    for r in rows:
+        if r.get("metrics"):
+            stage_records.extend(load_stage_records(r["metrics"]))
+    converted = [r for r in rows if r["status"] == "success"]
+    summary = {
+        "workers": workers,
+        "wall_s": total,
+        "files": len(rows),
+        "failed": len(rows) - len(converted),
+        "triangles_in": sum(r["triangles_in"] for r in converted),
+        "triangles_out": sum(r["triangles_out"] for r in converted),
+        "stages": summarize_stages(stage_records),
+        "files_detail": rows,
+    }
+    json_path = os.path.join(log_dir, f"{timestamp}_cad_report.json")
+    with open(json_path, "w") as f:
+        json.dump(summary, f, indent=4)
+
+    if stage_records:
+        print("\n⏱️  Per-stage summary:")
+        print_stage_summary(summary["stages"])
+    if summary["triangles_in"]:
+        print(f"\nTriangles: {summary['triangles_in']} -> {summary['triangles_out']} "
+              f"({1 - summary['triangles_out'] / summary['triangles_in']:.0%} fewer)")
+    print(f"Converted {len(converted)}/{len(rows)} files in {total:.1f} s")
+    print(f"📄 Report written to {csv_path} and {json_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the CAD models (STL / STEP) of downloaded objects to USD and OBJ in parallel.")
+    parser.add_argument("root", help="Downloaded dataset root (folders <object>/cad/)")
+    parser.add_argument("--pattern", default=None, help="Only convert objects whose folder name matches this regex (e.g. '^(atb1_)')")
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent Blender instances (default: half the CPU count)")
+    parser.add_argument("--tolerance", type=float, default=1e-4, help="Max deviation in metres from the CAD surface (STEP: split between tessellation and simplification; STL: relative to the STL mesh; 0 = no simplification)")
+    parser.add_argument("--merge-distance", type=float, default=1e-6, help="Merge vertices closer than this (metres)")
+    parser.add_argument("--scale", type=float, default=None, help="Metres per file unit, overriding the STL header / mm default")
+    parser.add_argument("--blender", default=BLENDER_PATH, help="Blender executable")
+    parser.add_argument("--force", action="store_true", help="Also reconvert files that already have a report")
+    parser.add_argument("--yes", action="store_true", help="Don't ask for confirmation")
+    args = parser.parse_args()
+
+    BLENDER_PATH = args.blender
+    main(os.path.abspath(args.root), args.pattern, args.workers, args.scale, args.tolerance, args.merge_distance,
+         skip_existing=not args.force, confirm=not args.yes)
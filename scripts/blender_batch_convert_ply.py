@@ -5,17 +5,23 @@ import csv
 import subprocess
 import glob
 import re
+import json
 from datetime import datetime
 
+from stage_metrics import load_stage_records, summarize_stages, print_stage_summary
+
 # Path to blender executable
 # BLENDER_PATH = "/home/csrobot/software/blender-4.3.2-linux-x64/blender"
 BLENDER_PATH = "blender"
 
 # Path to the blender python script we already wrote
-CONVERSION_SCRIPT = "/home/csrobot/moad_cui/scripts/blender_convert_ply.py"
-if not os.path.exists(CONVERSION_SCRIPT):
-    print(f"ERROR: Conversion script file not found, set it at the top of this script.\n Current: {CONVERSION_SCRIPT}")
-    exit(1)
+CONVERSION_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "blender_convert_ply.py")
+
+
+def check_conversion_script():
+    if not os.path.exists(CONVERSION_SCRIPT):
+        print(f"ERROR: Conversion script file not found, set it at the top of this script.\n Current: {CONVERSION_SCRIPT}")
+        exit(1)
 
 
 def find_meshes(root, object_pattern=None):
@@ -69,17 +75,28 @@ def already_processed(mesh_path):
     ])
 
 
-def run_blender(mesh_path):
-    """Run Blender in background mode on one folder."""
-    cmd = [
-        BLENDER_PATH,
-        "--background",
+def run_blender(mesh_path, metrics_path=None, threads=None, log_path=None):
+    """
+    Run Blender in background mode on one folder, optionally redirecting its stage metrics,
+    limiting its thread count and writing its output to a log file.
+    """
+    env = dict(os.environ)
+    if metrics_path:
+        env["MOAD_METRICS_PATH"] = metrics_path
+    cmd = [BLENDER_PATH, "--background"]
+    if threads:
+        cmd += ["--threads", str(threads)]
+    cmd += [
         "--python", CONVERSION_SCRIPT,
         "--", mesh_path
     ]
     print(f"\n🚀 Running Blender on {mesh_path}")
     start = time.time()
-    result = subprocess.run(cmd)
+    if log_path:
+        with open(log_path, "w") as log:
+            result = subprocess.run(cmd, env=env, stdout=log, stderr=subprocess.STDOUT)
+    else:
+        result = subprocess.run(cmd, env=env)
     elapsed = time.time() - start
     success = (result.returncode == 0)
     if success:
@@ -90,6 +107,7 @@ def run_blender(mesh_path):
 
 
 def main(search_root,object_pattern,auto_skip=True):
+    check_conversion_script()
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     meshes = find_meshes(search_root,object_pattern)
     print(f"Initial Search: {len(meshes)} meshes found...")
@@ -111,6 +129,10 @@ def main(search_root,object_pattern,auto_skip=True):
 
     # Results for CSV log
     results = []
+    log_dir = os.path.join(search_root, "_blender_logs")
+    metrics_dir = os.path.join(log_dir, f"{timestamp}_stages")
+    os.makedirs(metrics_dir, exist_ok=True)
+    stage_records = []
 
     for mesh in meshes:
         mesh_timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
@@ -125,12 +147,14 @@ def main(search_root,object_pattern,auto_skip=True):
                 results.append((mesh_timestamp, model_name, 0.0, "skipped"))
                 continue
 
-        elapsed, success = run_blender(mesh)
+        object_name = os.path.basename(os.path.dirname(folder))
+        metrics_path = os.path.join(metrics_dir, f"{object_name}.jsonl")
+        elapsed, success = run_blender(mesh, metrics_path)
         results.append((mesh_timestamp, model_name, elapsed, "success" if success else "fail"))
+        stage_records.extend(load_stage_records(metrics_path))
 
     # Write CSV summary log
-    log_name = f"_blender_logs/{timestamp}_conversion_summary.csv"
-    log_path = os.path.join(search_root, log_name)
+    log_path = os.path.join(log_dir, f"{timestamp}_conversion_summary.csv")
     with open(log_path, "w", newline="") as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(["Timestamp","Model", "TimeSeconds", "Status"])
@@ -138,6 +162,35 @@ def main(search_root,object_pattern,auto_skip=True):
 
     print(f"\n📄 Summary written to {log_path}")
 
+    # Write per-stage summary across all converted objects
+    if stage_records:
+        summary = summarize_stages(stage_records)
+        summary_path = os.path.join(log_dir, f"{timestamp}_stage_summary.json")
+        with open(summary_path, "w") as f:
+            json.dump({"objects": sorted({r["object"] for r in stage_records}), "stages": summary}, f, indent=4)
+        print("\n⏱️  Per-stage summary:")
+        print_stage_summary(summary)
+        print(f"\n📄 Stage summary written to {summary_path}")
+
+    # Texture memory budget across all objects (including ones converted by earlier runs)
+    reports = []
+    for mesh in meshes:
+        report_path = os.path.join(os.path.dirname(mesh), "texture_report.json")
+        if os.path.exists(report_path):
+            with open(report_path, "r") as f:
+                reports.append(json.load(f))
+    if reports:
+        budget_path = os.path.join(log_dir, f"{timestamp}_texture_budget.csv")
+        with open(budget_path, "w", newline="") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(["Object", "SurfaceAreaM2", "TextureSize", "TexelsPerMeter", "GpuBytesMipmapped", "PngBytes", "Ktx2Bytes"])
+            for r in sorted(reports, key=lambda r: -r["gpu_bytes_rgba8_mipmapped"]):
+                writer.writerow([r["object"], f"{r['surface_area_m2']:.6f}", r["texture_size"], f"{r['texel_density']:.0f}",
+                                 r["gpu_bytes_rgba8_mipmapped"], r["png_bytes"], r["ktx2_bytes"] or ""])
+        total = sum(r["gpu_bytes_rgba8_mipmapped"] for r in reports)
+        print(f"\n🖼️  Texture memory for {len(reports)} objects: {total / 2**20:.1f} MiB (RGBA8 + mipmaps)")
+        print(f"📄 Texture budget written to {budget_path}")
+
 
 if __name__ == "__main__":
     DEFAULT_ROOT = "/home/csrobot/data-mount/MOAD_V2"
@@ -1,6 +1,16 @@
 import bpy
+import bmesh
+from mathutils.bvhtree import BVHTree
 import os
 import sys
+import json
+import argparse
+import numpy as np
+
+# Blender does not put the script directory on sys.path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from stage_metrics import StageRecorder, FORMAT_JSONL
+from cad_io import stl_unit
 
 # -----------------------
 # Parse command line args
@@ -12,82 +22,239 @@ else:
     argv = []
 
 if len(argv) < 1:
-    raise ValueError("Usage: blender --background --python script.py -- /path/to/input_file")
+    raise ValueError("Usage: blender --background --python script.py -- /path/to/input_file [--scale S] [--tolerance T]")
+
+parser = argparse.ArgumentParser(prog="blender_convert_cad_to_usd.py")
+parser.add_argument("input_file")
+parser.add_argument("--output-dir", default=None, help="Default: <input dir>/converted")
+parser.add_argument("--scale", type=float, default=None, help="Metres per file unit (default: from the STL header, else mm)")
+parser.add_argument("--merge-distance", type=float, default=1e-6, help="Merge vertices closer than this (metres)")
+parser.add_argument("--tolerance", type=float, default=1e-4, help="Max chordal deviation allowed by simplification (metres, 0 = off)")
+args = parser.parse_args(argv)
 
-input_mesh = os.path.abspath(argv[0])
+input_mesh = os.path.abspath(args.input_file)
 input_dir = os.path.dirname(input_mesh)
-# Output dir -- save to same directory
-output_dir = input_dir
+stem = os.path.splitext(os.path.basename(input_mesh))[0]
+# Outputs are named after the input file, so several CAD files in one folder don't overwrite each other
+output_dir = os.path.abspath(args.output_dir) if args.output_dir else os.path.join(input_dir, "converted")
+os.makedirs(output_dir, exist_ok=True)
 
 # -----------------------
-# SETTINGS 
+# SETTINGS
 # -----------------------
-scale_factor = 0.001
+if args.scale is not None:
+    unit, scale_factor, unit_from_file = "custom", args.scale, False
+else:
+    unit, scale_factor, unit_from_file = stl_unit(input_mesh)
 model_color = (207, 159, 255,255)
+MIN_RATIO = 0.01        # Lowest decimation ratio tried
+SEARCH_STEPS = 8        # Bisection steps of the ratio search
+SAMPLE_POINTS = 20000   # Vertices sampled when measuring deviation
+
+metrics_path = os.environ.get("MOAD_METRICS_PATH", os.path.join(output_dir, f"{stem}_stage_metrics.jsonl"))
+recorder = StageRecorder(stem, metrics_path, fmt=os.environ.get("MOAD_METRICS_FORMAT", FORMAT_JSONL))
+
+
+def mesh_arrays(mesh):
+    """Vertex positions (N,3) and triangle indices (T,3) of a mesh, via foreach_get."""
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    mesh.calc_loop_triangles()
+    tris = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("vertices", tris)
+    return co.reshape(-1, 3), tris.reshape(-1, 3)
+
+
+def sample(points, n, seed=0):
+    if len(points) <= n:
+        return points
+    return points[np.random.default_rng(seed).choice(len(points), n, replace=False)]
+
+
+def max_deviation(bvh, points, limit=float("inf")):
+    """Largest distance from any of `points` to the surface in `bvh` (stops early once above `limit`)."""
+    worst = 0.0
+    for p in points:
+        _, _, _, dist = bvh.find_nearest(p)
+        if dist is None:
+            return float("inf")
+        worst = max(worst, dist)
+        if worst > limit:
+            break
+    return worst
+
+
+def decimated_arrays(o, ratio):
+    """Mesh arrays of `o` with a collapse Decimate at `ratio`, without applying it."""
+    dec = o.modifiers.new("Decimate", 'DECIMATE')
+    dec.decimate_type = 'COLLAPSE'
+    dec.ratio = ratio
+    eval_obj = o.evaluated_get(bpy.context.evaluated_depsgraph_get())
+    arrays = mesh_arrays(eval_obj.to_mesh())
+    eval_obj.to_mesh_clear()
+    o.modifiers.remove(dec)
+    return arrays
+
+
+def deviation(original_bvh, original_samples, verts, tris, limit):
+    """Symmetric (sampled) Hausdorff distance between the original and a simplified mesh."""
+    bvh = BVHTree.FromPolygons(verts.tolist(), tris.tolist())
+    dev = max_deviation(bvh, original_samples, limit)
+    if dev > limit:
+        return dev
+    return max(dev, max_deviation(original_bvh, sample(verts, SAMPLE_POINTS), limit))
 
 
 # -----------------------
 # Clean scene
 # -----------------------
 print("Cleaning Scene...")
-bpy.ops.object.select_all(action='SELECT')
-bpy.ops.object.delete()
+with recorder.stage("clean_scene"):
+    bpy.ops.object.select_all(action='SELECT')
+    bpy.ops.object.delete()
 
 # -----------------------
 # Import mesh
 # -----------------------
 print(f"Importing mesh... \"{input_mesh}\"")
+print(f"Units: {unit} ({scale_factor} m/unit{', from file header' if unit_from_file else ''})")
+
+with recorder.stage("import", input_bytes=os.path.getsize(input_mesh), unit=unit, scale=scale_factor) as span:
+    # bpy.ops.preferences.addon_enable(module="io_mesh_ply")
+    # bpy.ops.import_mesh.ply(filepath=input_mesh)
+    bpy.ops.wm.stl_import(filepath=input_mesh)
+    obj = bpy.context.selected_objects[0]
+    obj.scale = (scale_factor, scale_factor, scale_factor)
 
-# bpy.ops.preferences.addon_enable(module="io_mesh_ply")
-# bpy.ops.import_mesh.ply(filepath=input_mesh)
-bpy.ops.wm.stl_import(filepath=input_mesh)
-obj = bpy.context.selected_objects[0]
-obj.scale = (scale_factor, scale_factor, scale_factor)
+    # Delete all other objects
+    for o in bpy.data.objects:
+        if o != obj:
+            bpy.data.objects.remove(o, do_unlink=True)
+    # Bake the scale into the vertices so distances below are in metres
+    bpy.context.view_layer.objects.active = obj
+    bpy.ops.object.transform_apply(location=False, rotation=False, scale=True)
+    triangles_in = len(mesh_arrays(obj.data)[1])
+    span["triangles_out"] = triangles_in
 
-# Delete all other objects
-for o in bpy.data.objects:
-    if o != obj:
-        bpy.data.objects.remove(o, do_unlink=True)
+# -----------------------
+# Merge duplicate vertices
+# -----------------------
+print(f"Merging vertices closer than {args.merge_distance} m...")
+with recorder.stage("merge_vertices", vertices_in=len(obj.data.vertices)) as span:
+    bm = bmesh.new()
+    bm.from_mesh(obj.data)
+    bmesh.ops.remove_doubles(bm, verts=bm.verts, dist=args.merge_distance)
+    bm.to_mesh(obj.data)
+    bm.free()
+    obj.data.update()
+    verts, tris = mesh_arrays(obj.data)
+    triangles_merged = len(tris)
+    span.update(vertices_out=len(verts), triangles_out=triangles_merged)
+
+# -----------------------
+# Simplify to chordal tolerance
+# -----------------------
+# Bisect the Decimate ratio for the fewest triangles whose deviation from the merged mesh stays within tolerance
+ratio, max_dev = 1.0, 0.0
+if args.tolerance > 0 and triangles_merged > 0:
+    print(f"Simplifying to a tolerance of {args.tolerance} m...")
+    with recorder.stage("simplify", tolerance=args.tolerance, triangles_in=triangles_merged) as span:
+        original_bvh = BVHTree.FromPolygons(verts.tolist(), tris.tolist())
+        original_samples = sample(verts, SAMPLE_POINTS)
+        lo, hi = MIN_RATIO, 1.0
+        dev = deviation(original_bvh, original_samples, *decimated_arrays(obj, lo), args.tolerance)
+        if dev <= args.tolerance:
+            ratio, max_dev = lo, dev
+        else:
+            for _ in range(SEARCH_STEPS):
+                mid = (lo * hi) ** 0.5
+                dev = deviation(original_bvh, original_samples, *decimated_arrays(obj, mid), args.tolerance)
+                if dev <= args.tolerance:
+                    hi, ratio, max_dev = mid, mid, dev
+                else:
+                    lo = mid
+        if ratio < 1.0:
+            dec = obj.modifiers.new("Decimate", 'DECIMATE')
+            dec.decimate_type = 'COLLAPSE'
+            dec.ratio = ratio
+            bpy.ops.object.modifier_apply(modifier=dec.name)
+        print(f"Decimate ratio {ratio:.3f}, max deviation {max_dev:.6f} m")
+        span.update(ratio=ratio, max_deviation_m=max_dev, triangles_out=len(mesh_arrays(obj.data)[1]))
+triangles_out = len(mesh_arrays(obj.data)[1])
 
 # -----------------------
 # Set origins
 # -----------------------
 print("Fixing Origin...")
-bpy.context.view_layer.objects.active = obj
-bpy.ops.object.origin_set(type='ORIGIN_CENTER_OF_MASS', center='BOUNDS')
-bpy.ops.object.origin_set(type='GEOMETRY_ORIGIN')
+with recorder.stage("set_origin"):
+    bpy.context.view_layer.objects.active = obj
+    bpy.ops.object.origin_set(type='ORIGIN_CENTER_OF_MASS', center='BOUNDS')
+    bpy.ops.object.origin_set(type='GEOMETRY_ORIGIN')
 
 ## ADD TEXTURE/MATERIAL
-# Create material
-mat = bpy.data.materials.new(name="SolidColorMat")
-mat.use_nodes = True
-nodes = mat.node_tree.nodes
-bsdf = nodes.get("Principled BSDF")
-if bsdf:
-    bsdf.inputs["Base Color"].default_value = model_color
-    bsdf.inputs["Roughness"].default_value = 0.4
-    bsdf.inputs["Metallic"].default_value = 0.0
-
-# Assign material to object
-if len(obj.data.materials):
-    obj.data.materials[0] = mat
-else:
-    obj.data.materials.append(mat)
-
+with recorder.stage("material"):
+    # Create material
+    mat = bpy.data.materials.new(name="SolidColorMat")
+    mat.use_nodes = True
+    nodes = mat.node_tree.nodes
+    bsdf = nodes.get("Principled BSDF")
+    if bsdf:
+        bsdf.inputs["Base Color"].default_value = model_color
+        bsdf.inputs["Roughness"].default_value = 0.4
+        bsdf.inputs["Metallic"].default_value = 0.0
 
+    # Assign material to object
+    if len(obj.data.materials):
+        obj.data.materials[0] = mat
+    else:
+        obj.data.materials.append(mat)
 
 
 # -----------------------
 # Export USD & OBJ
 # -----------------------
-usd_path = os.path.join(output_dir, "converted_cad.usd")
+usd_path = os.path.join(output_dir, f"{stem}.usd")
+obj_path = os.path.join(output_dir, f"{stem}.obj")
 
-# https://docs.blender.org/api/current/bpy.ops.wm.html#bpy.ops.wm.usd_export 
-bpy.ops.wm.usd_export(filepath=usd_path,check_existing=True)
-# bpy.ops.export_scene.usd(filepath=usd_path, selected_objects=True)
-# bpy.ops.export_scene.obj(filepath=obj_path, use_selection=True)
 # https://docs.blender.org/api/current/bpy.ops.wm.html#bpy.ops.wm.usd_export
-# bpy.ops.wm.obj_export(filepath=obj_path,check_existing=True,path_mode="COPY")
+with recorder.stage("export_usd", triangles=triangles_out) as span:
+    bpy.ops.wm.usd_export(filepath=usd_path,check_existing=False)
+    span["output_bytes"] = os.path.getsize(usd_path)
+# https://docs.blender.org/api/current/bpy.ops.wm.html#bpy.ops.wm.obj_export
+with recorder.stage("export_obj", triangles=triangles_out) as span:
+    bpy.ops.wm.obj_export(filepath=obj_path,check_existing=False,path_mode="COPY")
+    span["output_bytes"] = os.path.getsize(obj_path)
+
+recorder.close()
+
+# -----------------------
+# Report
+# -----------------------
+report = {
+    "input": input_mesh,
+    "unit": unit,
+    "unit_from_file": unit_from_file,
+    "scale": scale_factor,
+    "merge_distance_m": args.merge_distance,
+    "tolerance_m": args.tolerance,
+    "triangles_in": triangles_in,
+    "triangles_merged": triangles_merged,
+    "triangles_out": triangles_out,
+    "reduction": 1.0 - triangles_out / triangles_in if triangles_in else 0.0,
+    "decimate_ratio": ratio,
+    "max_deviation_m": max_dev,
+    "stages": {r["stage"]: r["wall_s"] for r in recorder.records},
+    "usd_path": usd_path,
+    "usd_bytes": os.path.getsize(usd_path),
+    "obj_path": obj_path,
+    "obj_bytes": os.path.getsize(obj_path),
+}
+report_path = os.path.join(output_dir, f"{stem}_report.json")
+with open(report_path, "w") as f:
+    json.dump(report, f, indent=4)
 
 print("✅ Processing complete!")
-print(f"USD:   {usd_path}")
\ No newline at end of file
+print(f"Triangles: {triangles_in} -> {triangles_merged} (merged) -> {triangles_out}")
+print(f"USD:   {usd_path}")
+print(f"OBJ:   {obj_path}")
+print(f"Report: {report_path}")
@@ -2,6 +2,15 @@ import bpy
 import os
 from os.path import basename,dirname
 import sys
+import json
+import math
+import shutil
+import subprocess
+import numpy as np
+
+# Blender does not put the script directory on sys.path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from stage_metrics import StageRecorder, FORMAT_JSONL
 
 # -----------------------
 # Parse command line args
@@ -32,68 +41,90 @@ for d in (usd_dir, obj_dir, blend_dir):
 # output_dir = "/home/csrobot/data-mount/MOAD_V2/ALL_ITEMS/clean_ply"
 # exit(0)
 
+# -----------------------
+# Stage metrics
+# -----------------------
+# Per-stage timings are written next to the input mesh unless overridden (e.g. by the batch runner)
+metrics_path = os.environ.get("MOAD_METRICS_PATH", os.path.join(input_dir, "stage_metrics.jsonl"))
+metrics_format = os.environ.get("MOAD_METRICS_FORMAT", FORMAT_JSONL)
+recorder = StageRecorder(obj_name, metrics_path, fmt=metrics_format)
+
+def mesh_stats(o, suffix):
+    return {f"vertices_{suffix}": len(o.data.vertices), f"faces_{suffix}": len(o.data.polygons)}
+
+def file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
 # -----------------------
 # Clean scene
 # -----------------------
 print("Cleaning Scene...")
-bpy.ops.object.select_all(action='SELECT')
-bpy.ops.object.delete()
+with recorder.stage("clean_scene"):
+    bpy.ops.object.select_all(action='SELECT')
+    bpy.ops.object.delete()
 
 # -----------------------
 # Import mesh
 # -----------------------
 print(f"Importing mesh... \"{input_mesh}\"")
 
-# bpy.ops.preferences.addon_enable(module="io_mesh_ply")
-# bpy.ops.import_mesh.ply(filepath=input_mesh)
-bpy.ops.wm.ply_import(filepath=input_mesh)
-obj = bpy.context.selected_objects[0]
-obj.scale = (0.814, 0.814, 0.814)
+with recorder.stage("import", input_bytes=file_size(input_mesh)) as span:
+    # bpy.ops.preferences.addon_enable(module="io_mesh_ply")
+    # bpy.ops.import_mesh.ply(filepath=input_mesh)
+    bpy.ops.wm.ply_import(filepath=input_mesh)
+    obj = bpy.context.selected_objects[0]
+    obj.scale = (0.814, 0.814, 0.814)
 
-# Delete all other objects
-for o in bpy.data.objects:
-    if o != obj:
-        bpy.data.objects.remove(o, do_unlink=True)
+    # Delete all other objects
+    for o in bpy.data.objects:
+        if o != obj:
+            bpy.data.objects.remove(o, do_unlink=True)
+    span.update(mesh_stats(obj, "out"))
 
 # -----------------------
 # Set origins
 # -----------------------
 print("Fixing Origin...")
-bpy.context.view_layer.objects.active = obj
-bpy.ops.object.origin_set(type='ORIGIN_CENTER_OF_MASS', center='BOUNDS')
-bpy.ops.object.origin_set(type='GEOMETRY_ORIGIN')
+with recorder.stage("set_origin"):
+    bpy.context.view_layer.objects.active = obj
+    bpy.ops.object.origin_set(type='ORIGIN_CENTER_OF_MASS', center='BOUNDS')
+    bpy.ops.object.origin_set(type='GEOMETRY_ORIGIN')
 
 # -----------------------
 # Separate loose parts & keep largest
 # -----------------------
 print("Separating loose parts...")
-bpy.ops.object.mode_set(mode='EDIT')
-bpy.ops.mesh.separate(type='LOOSE')
-bpy.ops.object.mode_set(mode='OBJECT')
+with recorder.stage("separate_loose", **mesh_stats(obj, "in")) as span:
+    bpy.ops.object.mode_set(mode='EDIT')
+    bpy.ops.mesh.separate(type='LOOSE')
+    bpy.ops.object.mode_set(mode='OBJECT')
 
-largest = max(bpy.context.selected_objects, key=lambda o: len(o.data.vertices))
-print(f"Separate parts: {len(bpy.context.selected_objects)}")
-for o in bpy.context.selected_objects:
-    if o != largest:
-        bpy.data.objects.remove(o, do_unlink=True)
+    largest = max(bpy.context.selected_objects, key=lambda o: len(o.data.vertices))
+    print(f"Separate parts: {len(bpy.context.selected_objects)}")
+    span["loose_parts"] = len(bpy.context.selected_objects)
+    for o in bpy.context.selected_objects:
+        if o != largest:
+            bpy.data.objects.remove(o, do_unlink=True)
 
-obj = largest
-obj.select_set(True)
+    obj = largest
+    obj.select_set(True)
+    span.update(mesh_stats(obj, "out"))
 # -----------------------
 # Add material with color attribute
 # -----------------------
 print("Material and color attributes...")
-mat = bpy.data.materials.new(name="FusedMaterial")
-mat.use_nodes = True
-nodes = mat.node_tree.nodes
-links = mat.node_tree.links
+with recorder.stage("material"):
+    mat = bpy.data.materials.new(name="FusedMaterial")
+    mat.use_nodes = True
+    nodes = mat.node_tree.nodes
+    links = mat.node_tree.links
 
-bsdf = nodes["Principled BSDF"]
-color_attr = nodes.new("ShaderNodeVertexColor")
-color_attr.layer_name = "Col" 
-links.new(color_attr.outputs['Color'], bsdf.inputs['Base Color'])
+    bsdf = nodes["Principled BSDF"]
+    color_attr = nodes.new("ShaderNodeVertexColor")
+    color_attr.layer_name = "Col" 
+    links.new(color_attr.outputs['Color'], bsdf.inputs['Base Color'])
 
-obj.data.materials.append(mat)
+    obj.data.materials.append(mat)
 
 # -----------------------
 # Decimate modifier
@@ -101,68 +132,182 @@ obj.data.materials.append(mat)
 # TODO: Maybe adapt this ratio based on the total vertices so we get models with a consistent number of vertices
 DEC_RATIO = 0.1
 print(f"Applying Decimate... Ratio: {DEC_RATIO}")
-dec = obj.modifiers.new("Decimate", 'DECIMATE')
-dec.ratio = DEC_RATIO
+with recorder.stage("decimate", ratio=DEC_RATIO, **mesh_stats(obj, "in")) as span:
+    dec = obj.modifiers.new("Decimate", 'DECIMATE')
+    dec.ratio = DEC_RATIO
+
+    # Force it active/selected before applying
+    bpy.context.view_layer.objects.active = obj
+    obj.select_set(True)
 
-# Force it active/selected before applying
-bpy.context.view_layer.objects.active = obj
-obj.select_set(True)
+    bpy.ops.object.modifier_apply(modifier=dec.name)
+    span.update(mesh_stats(obj, "out"))
 
-bpy.ops.object.modifier_apply(modifier=dec.name)
 
+# -----------------------
+# Texture settings
+# -----------------------
+# Texture resolution is chosen from the mesh surface area (in meters, after scaling) so that the
+# baked texture has roughly TEXEL_DENSITY texels per meter, rounded up to a power of two.
+TEXEL_DENSITY = float(os.environ.get("MOAD_TEXEL_DENSITY", 4096))
+MIN_TEX_SIZE = int(os.environ.get("MOAD_MIN_TEX_SIZE", 128))
+MAX_TEX_SIZE = int(os.environ.get("MOAD_MAX_TEX_SIZE", 4096))
+UV_MARGIN_PX = 2
+# Expected fraction of UV space covered by islands, used for the first resolution estimate
+UV_PACK_EFFICIENCY = 0.7
+# Optionally also write a compressed, mip-mapped KTX2 texture using toktx (KTX-Software)
+EXPORT_KTX2 = os.environ.get("MOAD_EXPORT_KTX2", "0") == "1"
+KTX2_TOOL = "toktx"
+
+def surface_area(o):
+    """Surface area of the mesh in world units (object scale applied)."""
+    areas = np.zeros(len(o.data.polygons), dtype=np.float64)
+    o.data.polygons.foreach_get("area", areas)
+    sx, sy, sz = o.scale
+    return float(areas.sum()) * abs(sx * sy * sz) ** (2.0 / 3.0)
+
+def uv_coverage(o):
+    """Fraction of the 0-1 UV square covered by the mesh's UV islands."""
+    me = o.data
+    me.calc_loop_triangles()
+    loops = np.zeros(len(me.loop_triangles) * 3, dtype=np.int64)
+    me.loop_triangles.foreach_get("loops", loops)
+    uv = np.zeros(len(me.loops) * 2, dtype=np.float64)
+    me.uv_layers.active.data.foreach_get("uv", uv)
+    tri = uv.reshape(-1, 2)[loops].reshape(-1, 3, 2)
+    e1, e2 = tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0]
+    return float(0.5 * np.abs(e1[:, 0] * e2[:, 1] - e1[:, 1] * e2[:, 0]).sum())
+
+def texture_size(area, coverage):
+    """Power of two texture size giving TEXEL_DENSITY texels/m over `area` m^2 spread over `coverage` of UV space."""
+    side = TEXEL_DENSITY * math.sqrt(area / max(coverage, 1e-6))
+    size = 2 ** math.ceil(math.log2(max(side, 1.0)))
+    return int(min(max(size, MIN_TEX_SIZE), MAX_TEX_SIZE))
+
+def pack_uv_islands(margin):
+    """
+    Pack the UV islands of the mesh in edit mode as tightly as possible, with `margin` as a
+    fraction of the UV space (i.e. of the texture size).
+    """
+    # margin_method was added in Blender 3.5 (its default, SCALED, scales the margin with the UVs),
+    # shape_method in 3.6
+    for options in ({"margin_method": 'FRACTION', "shape_method": 'CONCAVE'}, {"margin_method": 'FRACTION'}, {}):
+        try:
+            bpy.ops.uv.pack_islands(rotate=True, margin=margin, **options)
+            return
+        except TypeError:
+            continue
+
+mesh_area = surface_area(obj)
+tex_size = texture_size(mesh_area, UV_PACK_EFFICIENCY)
+print(f"Surface area: {mesh_area:.6f} m^2, initial texture size estimate: {tex_size}")
 
 # -----------------------
 # UV unwrap
 # -----------------------
 print("UV Unwrap...")
-# Ensure UV map exists
-if not obj.data.uv_layers:
-    bpy.ops.object.mode_set(mode='EDIT')
-    bpy.ops.mesh.select_all(action='SELECT')
-    bpy.ops.uv.smart_project()
-    bpy.ops.object.mode_set(mode='OBJECT')
-
-# Set the UV map as active
-obj.data.uv_layers.active = obj.data.uv_layers[0]
+with recorder.stage("uv_unwrap", **mesh_stats(obj, "in")) as span:
+    # Ensure UV map exists
+    unwrapped = not obj.data.uv_layers
+    if unwrapped:
+        bpy.ops.object.mode_set(mode='EDIT')
+        bpy.ops.mesh.select_all(action='SELECT')
+        bpy.ops.uv.smart_project(island_margin=UV_MARGIN_PX / tex_size)
+        # Even texel density across islands, then pack them as tightly as possible
+        bpy.ops.uv.average_islands_scale()
+        pack_uv_islands(UV_MARGIN_PX / tex_size)
+        bpy.ops.object.mode_set(mode='OBJECT')
+
+    # Set the UV map as active
+    obj.data.uv_layers.active = obj.data.uv_layers[0]
+
+    # Final resolution from the measured UV coverage
+    coverage = uv_coverage(obj)
+    estimate, tex_size = tex_size, texture_size(mesh_area, coverage)
+    if unwrapped and tex_size != estimate:
+        # The margin was sized for the estimate; repack so it stays UV_MARGIN_PX at the final size
+        bpy.ops.object.mode_set(mode='EDIT')
+        bpy.ops.mesh.select_all(action='SELECT')
+        pack_uv_islands(UV_MARGIN_PX / tex_size)
+        bpy.ops.object.mode_set(mode='OBJECT')
+        coverage = uv_coverage(obj)
+    span.update(surface_area_m2=mesh_area, uv_coverage=coverage, texture_size=tex_size)
+print(f"UV coverage: {coverage:.1%}, texture size: {tex_size}x{tex_size}")
 
 
 # -----------------------
 # Bake texture
 # -----------------------
 print("Baking texture...")
-# Create new image for baking
-img = bpy.data.images.new("BakedTex", width=2048, height=2048)
+with recorder.stage("bake", width=tex_size, height=tex_size, **mesh_stats(obj, "in")):
+    # Create new image for baking
+    img = bpy.data.images.new("BakedTex", width=tex_size, height=tex_size)
 
-# Add image node & set active for baking
-tex_node = nodes.new("ShaderNodeTexImage")
-tex_node.image = img
-nodes.active = tex_node
+    # Add image node & set active for baking
+    tex_node = nodes.new("ShaderNodeTexImage")
+    tex_node.image = img
+    nodes.active = tex_node
 
-# Ensure correct object/material active
-bpy.context.view_layer.objects.active = obj
-obj.select_set(True)
+    # Ensure correct object/material active
+    bpy.context.view_layer.objects.active = obj
+    obj.select_set(True)
 
-# Set render engine to Cycles
-bpy.context.scene.render.engine = 'CYCLES'
+    # Set render engine to Cycles
+    bpy.context.scene.render.engine = 'CYCLES'
 
-# Set scene to use GPU
-bpy.context.scene.cycles.device = 'GPU'
+    # Set scene to use GPU
+    bpy.context.scene.cycles.device = 'GPU'
 
-# Configure bake to color only
-bpy.context.scene.cycles.bake_type = 'DIFFUSE'
-bpy.context.scene.render.bake.use_pass_direct = False
-bpy.context.scene.render.bake.use_pass_indirect = False
-bpy.context.scene.render.bake.use_pass_color = True
+    # Configure bake to color only
+    bpy.context.scene.cycles.bake_type = 'DIFFUSE'
+    bpy.context.scene.render.bake.use_pass_direct = False
+    bpy.context.scene.render.bake.use_pass_indirect = False
+    bpy.context.scene.render.bake.use_pass_color = True
 
-# Perform bake
-bpy.ops.object.bake(type='DIFFUSE')
+    # Perform bake
+    bpy.ops.object.bake(type='DIFFUSE')
 
 # Save baked texture
 print("Save baked texture...")
 tex_path = os.path.join(input_dir, "baked_texture.png")
-img.filepath_raw = tex_path
-img.file_format = 'PNG'
-img.save()
+with recorder.stage("save_texture") as span:
+    img.filepath_raw = tex_path
+    img.file_format = 'PNG'
+    img.save()
+    span["output_bytes"] = file_size(tex_path)
+
+# Compressed, mip-mapped copy of the texture
+ktx2_path = None
+if EXPORT_KTX2:
+    if shutil.which(KTX2_TOOL):
+        print("Compressing texture (KTX2)...")
+        ktx2_path = os.path.join(input_dir, "baked_texture.ktx2")
+        with recorder.stage("compress_texture") as span:
+            cmd = [KTX2_TOOL, "--t2", "--encode", "uastc", "--genmipmap", ktx2_path, tex_path]
+            if subprocess.run(cmd).returncode != 0:
+                print(f"WARNING: {KTX2_TOOL} failed, no KTX2 texture written")
+                ktx2_path = None
+            span["output_bytes"] = file_size(ktx2_path) if ktx2_path else 0
+    else:
+        print(f"WARNING: {KTX2_TOOL} not found, skipping KTX2 texture compression")
+
+# Texture memory report, used to budget scene memory
+texture_report = {
+    "object": obj_name,
+    "surface_area_m2": mesh_area,
+    "uv_coverage": coverage,
+    "texel_density_target": TEXEL_DENSITY,
+    "texel_density": tex_size * math.sqrt(coverage / mesh_area) if mesh_area > 0 else 0.0,
+    "texture_size": tex_size,
+    "png_bytes": file_size(tex_path),
+    "gpu_bytes_rgba8": tex_size * tex_size * 4,
+    "gpu_bytes_rgba8_mipmapped": tex_size * tex_size * 4 * 4 // 3,
+    "ktx2_path": ktx2_path,
+    "ktx2_bytes": file_size(ktx2_path) if ktx2_path else None,
+}
+texture_report_path = os.path.join(input_dir, "texture_report.json")
+with open(texture_report_path, "w") as f:
+    json.dump(texture_report, f, indent=4)
 
 # Connect baked texture to material
 print("Connecting baked texture to material...")
@@ -173,7 +318,9 @@ links.new(tex_node.outputs['Color'], bsdf.inputs['Base Color'])
 # -----------------------
 print("Saving Blend file...")
 blend_path = os.path.join(blend_dir, "fused_model.blend")
-bpy.ops.wm.save_as_mainfile(filepath=blend_path)
+with recorder.stage("save_blend") as span:
+    bpy.ops.wm.save_as_mainfile(filepath=blend_path)
+    span["output_bytes"] = file_size(blend_path)
 
 # -----------------------
 # Export USD & OBJ
@@ -182,11 +329,16 @@ usd_path = os.path.join(usd_dir, "fused_model.usd")
 obj_path = os.path.join(obj_dir, "fused_model.obj")
 
 # https://docs.blender.org/api/current/bpy.ops.wm.html#bpy.ops.wm.usd_export 
-bpy.ops.wm.usd_export(filepath=usd_path,check_existing=True)
+with recorder.stage("export_usd", **mesh_stats(obj, "in")) as span:
+    bpy.ops.wm.usd_export(filepath=usd_path,check_existing=True)
+    span["output_bytes"] = file_size(usd_path)
 # bpy.ops.export_scene.usd(filepath=usd_path, selected_objects=True)
 # bpy.ops.export_scene.obj(filepath=obj_path, use_selection=True)
 # https://docs.blender.org/api/current/bpy.ops.wm.html#bpy.ops.wm.usd_export
-bpy.ops.wm.obj_export(filepath=obj_path,check_existing=True,path_mode="COPY")
+with recorder.stage("export_obj", **mesh_stats(obj, "in")) as span:
+    bpy.ops.wm.obj_export(filepath=obj_path,check_existing=True,path_mode="COPY")
+    span["output_bytes"] = file_size(obj_path)
+recorder.close()
 
 ## JUST SAVE PLY
 # obj_path = os.path.join(output_dir,obj_name+".ply")
@@ -195,4 +347,5 @@ print("✅ Processing complete!")
 print(f"Blend: {blend_path}")
 print(f"USD:   {usd_path}")
 print(f"OBJ:   {obj_path}")
-print(f"Tex:   {tex_path}")
+print(f"Tex:   {tex_path} ({tex_size}x{tex_size})")
+print(f"Stage metrics: {metrics_path}")
@@ -0,0 +1,271 @@
+import os
+from os.path import join
+import re
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import tempfile
+import time
+
+# Linux ioctl for copy-on-write file clones (btrfs, XFS, ...)
+FICLONE = 0x40049409
+LINK_MODES = ("auto", "reflink", "hardlink", "copy")
+MANIFEST_NAME = ".moad_blobs.jsonl"
+# Outputs that blender_convert_ply.py rewrites in place. They are never hardlinked, since writing
+# through a hardlink would change the shared blob (and every other target directory's copy)
+REGENERATED_RE = re.compile(r"(^|/)fused/(obj|usd|blend)/|(^|/)baked_texture\.[^/]+$")
+
+
+def _reflink(src, dst):
+    """Create `dst` as a copy-on-write clone of `src`. Raises OSError if unsupported."""
+    import fcntl
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.remove(dst)
+            raise
+
+
+def file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class BlobStore:
+    """
+    Content-addressed local store for downloaded files.
+
+    Layout:
+        {root}/blobs/ab/abcdef...   file contents, keyed by sha256 (read-only)
+        {root}/etags/<etag>         sha256 of the blob downloaded for that S3 ETag
+        {root}/roots.txt            target directories that have been materialized from the store
+        {root}/tmp/                 in-progress downloads
+
+    Each target directory gets a MANIFEST_NAME file (JSON lines of {"path", "sha"}) recording which
+    files were materialized from which blob, so `gc` can tell which blobs are still referenced.
+    """
+    def __init__(self, root, link_mode="auto"):
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"Unknown link mode '{link_mode}', expected one of {LINK_MODES}")
+        self.root = os.path.abspath(root)
+        self.link_mode = link_mode
+        self._registered = set()
+        for d in ("blobs", "etags", "tmp"):
+            os.makedirs(join(self.root, d), exist_ok=True)
+
+    # -----------------------
+    # Lookup / ingest
+    # -----------------------
+    def blob_path(self, sha):
+        return join(self.root, "blobs", sha[:2], sha)
+
+    def _etag_path(self, etag):
+        return join(self.root, "etags", etag.strip('"').replace("/", "_"))
+
+    def lookup_etag(self, etag):
+        """Return the sha256 of the blob stored for an S3 ETag, or None if not present."""
+        try:
+            with open(self._etag_path(etag), "r") as f:
+                sha = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return sha if os.path.exists(self.blob_path(sha)) else None
+
+    def temp_path(self):
+        """A fresh path inside the store (same filesystem as the blobs) to download into."""
+        fd, path = tempfile.mkstemp(dir=join(self.root, "tmp"), suffix=".part")
+        os.close(fd)
+        return path
+
+    def ingest(self, path, etag=None):
+        """
+        Move a downloaded file into the store, deduplicating by content.
+
+        Returns:
+            str: sha256 of the stored blob.
+        """
+        sha = file_sha256(path)
+        blob = self.blob_path(sha)
+        if os.path.exists(blob):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.chmod(path, 0o444)
+            os.replace(path, blob)
+        if etag:
+            tmp = self._etag_path(etag) + ".tmp"
+            with open(tmp, "w") as f:
+                f.write(sha)
+            os.replace(tmp, self._etag_path(etag))
+        return sha
+
+    # -----------------------
+    # Materialize
+    # -----------------------
+    def materialize(self, sha, dest, target_root):
+        """
+        Create `dest` from a stored blob using the configured link mode, and record it in the
+        manifest of `target_root`. Files matching REGENERATED_RE are reflinked or copied instead
+        of hardlinked.
+
+        Returns:
+            str: The link mode actually used ('reflink', 'hardlink' or 'copy').
+        """
+        blob = self.blob_path(sha)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        modes = ("reflink", "hardlink", "copy") if self.link_mode == "auto" else (self.link_mode,)
+        rel = os.path.relpath(os.path.abspath(dest), os.path.abspath(target_root)).replace(os.sep, "/")
+        if REGENERATED_RE.search(rel):
+            modes = tuple(m for m in modes if m != "hardlink") or ("reflink", "copy")
+        used = None
+        for mode in modes:
+            try:
+                if mode == "reflink":
+                    _reflink(blob, dest)
+                elif mode == "hardlink":
+                    os.link(blob, dest)
+                else:
+                    shutil.copyfile(blob, dest)
+                used = mode
+                break
+            except (OSError, ImportError):
+                if mode == modes[-1]:
+                    raise
+        self._record(target_root, dest, sha)
+        return used
+
+    def _record(self, target_root, dest, sha):
+        target_root = os.path.abspath(target_root)
+        self.register_root(target_root)
+        entry = {"path": os.path.relpath(os.path.abspath(dest), target_root), "sha": sha}
+        with open(join(target_root, MANIFEST_NAME), "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def roots(self):
+        path = join(self.root, "roots.txt")
+        if not os.path.exists(path):
+            return []
+        with open(path, "r") as f:
+            return [line.strip() for line in f if line.strip()]
+
+    def register_root(self, target_root):
+        target_root = os.path.abspath(target_root)
+        if target_root in self._registered:
+            return
+        if target_root not in self.roots():
+            with open(join(self.root, "roots.txt"), "a") as f:
+                f.write(target_root + "\n")
+        self._registered.add(target_root)
+
+    # -----------------------
+    # Maintenance
+    # -----------------------
+    def referenced(self):
+        """Set of blob hashes still referenced by a file in any registered target directory."""
+        refs = set()
+        for target_root in self.roots():
+            manifest = join(target_root, MANIFEST_NAME)
+            if not os.path.exists(manifest):
+                continue
+            latest = {}
+            with open(manifest, "r") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        latest[entry["path"]] = entry["sha"]
+            for rel, sha in latest.items():
+                path = join(target_root, rel)
+                blob = self.blob_path(sha)
+                if not os.path.exists(path) or not os.path.exists(blob):
+                    continue
+                # Still the materialized file if it is the same inode (hardlink) or the same size (reflink/copy)
+                st, bst = os.stat(path), os.stat(blob)
+                if (st.st_ino, st.st_dev) == (bst.st_ino, bst.st_dev) or st.st_size == bst.st_size:
+                    refs.add(sha)
+        return refs
+
+    def iter_blobs(self):
+        for dirpath, _, filenames in os.walk(join(self.root, "blobs")):
+            for name in filenames:
+                yield name, join(dirpath, name)
+
+    def gc(self, dry_run=False, tmp_max_age=3600):
+        """
+        Remove blobs that are no longer referenced by any materialized file, plus their ETag
+        entries and temporary downloads older than `tmp_max_age` seconds. Blobs with extra
+        hardlinks are always kept.
+
+        Returns:
+            tuple: (number of blobs removed, bytes freed)
+        """
+        refs = self.referenced()
+        removed, freed = 0, 0
+        for sha, path in self.iter_blobs():
+            st = os.stat(path)
+            if sha in refs or st.st_nlink > 1:
+                continue
+            removed += 1
+            freed += st.st_size
+            print(f"🗑️  {'Would remove' if dry_run else 'Removing'} blob {sha} ({st.st_size} bytes)")
+            if not dry_run:
+                os.chmod(path, 0o644)
+                os.remove(path)
+        if not dry_run:
+            for name in os.listdir(join(self.root, "etags")):
+                etag_file = join(self.root, "etags", name)
+                with open(etag_file, "r") as f:
+                    sha = f.read().strip()
+                if not os.path.exists(self.blob_path(sha)):
+                    os.remove(etag_file)
+            for name in os.listdir(join(self.root, "tmp")):
+                tmp_file = join(self.root, "tmp", name)
+                if time.time() - os.path.getmtime(tmp_file) > tmp_max_age:
+                    os.remove(tmp_file)
+        return removed, freed
+
+    def stats(self):
+        count, size = 0, 0
+        for _, path in self.iter_blobs():
+            count += 1
+            size += os.path.getsize(path)
+        return {"blobs": count, "bytes": size, "referenced": len(self.referenced()), "roots": self.roots()}
+
+
+def store_from_config(config):
+    """Create a BlobStore from the 'blob_store' section of downloader_config.json, or None if disabled."""
+    store_cfg = config.get("blob_store", {})
+    if not store_cfg.get("enabled", False):
+        return None
+    return BlobStore(store_cfg["directory"], link_mode=store_cfg.get("link_mode", "auto"))
+
+
+# === MAIN ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the MOADv2 content-addressed download store.")
+    parser.add_argument("command", choices=["gc", "stats"])
+    parser.add_argument("--store", default=None, help="Store directory (default: blob_store.directory from downloader_config.json)")
+    parser.add_argument("--dry-run", action="store_true", help="gc: only list the blobs that would be removed")
+    args = parser.parse_args()
+
+    store_dir = args.store
+    if store_dir is None:
+        config_path = join(os.path.dirname(os.path.realpath(__file__)), "../config/downloader_config.json")
+        with open(config_path, "r") as f:
+            store_dir = json.load(f).get("blob_store", {}).get("directory")
+    if not store_dir or not os.path.isdir(store_dir):
+        print(f"Blob store directory not found: {store_dir}")
+        sys.exit(1)
+
+    store = BlobStore(store_dir)
+    if args.command == "gc":
+        removed, freed = store.gc(dry_run=args.dry_run)
+        print(f"\n✅ {'Would remove' if args.dry_run else 'Removed'} {removed} blobs ({freed / 1e6:.1f} MB)")
+    else:
+        print(json.dumps(store.stats(), indent=4))
@@ -0,0 +1,285 @@
+import os
+from os.path import join
+import sys
+import json
+import math
+import time
+import argparse
+import numpy as np
+
+from mesh_io import read_obj
+
+try:
+    import pybullet
+except ImportError:
+    pybullet = None
+
+# Same physical properties as the per-object URDFs written by create_urdf_files.py
+MASS = 0.01
+INERTIA = 1e-3
+LATERAL_FRICTION = 0.8
+SPINNING_FRICTION = 0.001
+ROLLING_FRICTION = 0.001
+GRID_SPACING = 0.15
+
+
+def prim_name(name):
+    """A valid USD prim / SDF model name from an object or instance name."""
+    name = "".join(c if c.isalnum() or c == "_" else "_" for c in name)
+    return name if not name[0].isdigit() else "_" + name
+
+
+def default_placements(objects):
+    """Place each object of the group once on a square grid."""
+    cols = max(1, math.ceil(math.sqrt(len(objects))))
+    return [{"object": o, "name": o, "xyz": [(i % cols) * GRID_SPACING, (i // cols) * GRID_SPACING, 0.0],
+             "rpy": [0.0, 0.0, 0.0]} for i, o in enumerate(objects)]
+
+
+def load_placements(path, objects):
+    """
+    Load a placement file: {"instances": [{"object": name, "name": optional, "xyz": [..], "rpy": [..]}]}.
+    Instances without a name are numbered per object.
+    """
+    with open(path, "r") as f:
+        instances = json.load(f)["instances"]
+    counts = {}
+    for inst in instances:
+        if inst["object"] not in objects:
+            print(f"WARNING: {inst['object']} is not part of the selected group")
+        counts[inst["object"]] = counts.get(inst["object"], 0) + 1
+        inst.setdefault("name", f"{inst['object']}_{counts[inst['object']]}")
+        inst.setdefault("xyz", [0.0, 0.0, 0.0])
+        inst.setdefault("rpy", [0.0, 0.0, 0.0])
+    return instances
+
+
+# =======================
+# Mesh cache
+# =======================
+def build_mesh_cache(folder, object_name, cache_dir):
+    """
+    Parse fused/obj/fused_model.obj once into a binary .npz (float32 vertices, int32 faces).
+    The cache is rebuilt when the OBJ is newer than it.
+
+    Returns:
+        str: Path of the cache file, or None if the object has no OBJ mesh.
+    """
+    obj_path = join(folder, object_name, "fused", "obj", "fused_model.obj")
+    if not os.path.exists(obj_path):
+        return None
+    cache_path = join(cache_dir, f"{object_name}.npz")
+    if not os.path.exists(cache_path) or os.path.getmtime(cache_path) < os.path.getmtime(obj_path):
+        vertices, faces = read_obj(obj_path)
+        os.makedirs(cache_dir, exist_ok=True)
+        np.savez(cache_path, vertices=vertices, faces=faces)
+    return cache_path
+
+
+# =======================
+# Writers
+# =======================
+def write_usda(path, parts, instances, usd_prim=None):
+    """
+    Write a USD stage in which every instance references its part's fused_model.usd and is marked
+    instanceable, so USD shares one prototype per unique part. Instances of parts without a USD
+    file are left out.
+
+    Returns:
+        int: Number of instances written.
+    """
+    lines = ['#usda 1.0', '(', '    defaultPrim = "World"', '    metersPerUnit = 1', '    upAxis = "Z"', ')', '',
+             'def Xform "World"', '{']
+    written = 0
+    for inst in instances:
+        if parts[inst["object"]]["usd"] is None:
+            continue
+        written += 1
+        usd = os.path.relpath(parts[inst["object"]]["usd"], os.path.dirname(path))
+        target = f"@{usd}@" + (f"<{usd_prim}>" if usd_prim else "")
+        x, y, z = inst["xyz"]
+        r, p, yw = [math.degrees(a) for a in inst["rpy"]]
+        lines += [
+            f'    def Xform "{prim_name(inst["name"])}" (',
+            '        instanceable = true',
+            f'        prepend references = {target}',
+            '    )',
+            '    {',
+            f'        double3 xformOp:translate = ({x}, {y}, {z})',
+            f'        float3 xformOp:rotateXYZ = ({r}, {p}, {yw})',
+            '        uniform token[] xformOpOrder = ["xformOp:translate", "xformOp:rotateXYZ"]',
+            '    }',
+        ]
+    lines.append('}')
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return written
+
+
+def write_sdf(path, parts, instances, world_name):
+    """Write an SDF world with one model per instance; repeated parts share the same mesh file."""
+    lines = ['<?xml version="1.0" ?>', '<sdf version="1.6">', f'  <world name="{prim_name(world_name)}">']
+    for inst in instances:
+        mesh = os.path.relpath(parts[inst["object"]]["obj"], os.path.dirname(path))
+        pose = " ".join(str(v) for v in list(inst["xyz"]) + list(inst["rpy"]))
+        geometry = f'<geometry><mesh><uri>{mesh}</uri><scale>1 1 1</scale></mesh></geometry>'
+        lines += [
+            f'    <model name="{prim_name(inst["name"])}">',
+            f'      <pose>{pose}</pose>',
+            '      <link name="baseLink">',
+            f'        <inertial><mass>{MASS}</mass><inertia><ixx>{INERTIA}</ixx><ixy>0</ixy><ixz>0</ixz>'
+            f'<iyy>{INERTIA}</iyy><iyz>0</iyz><izz>{INERTIA}</izz></inertia></inertial>',
+            f'        <collision name="collision">{geometry}'
+            f'<surface><friction><ode><mu>{LATERAL_FRICTION}</mu><mu2>{LATERAL_FRICTION}</mu2></ode></friction></surface></collision>',
+            f'        <visual name="visual">{geometry}</visual>',
+            '      </link>',
+            '    </model>',
+        ]
+    lines += ['  </world>', '</sdf>']
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def build_scene(folder, group_name, objects, output_dir, placements=None, usd_prim=None):
+    """
+    Build scene.usda, scene.sdf and scene.json (instances + per-part mesh caches) for a group.
+    scene.json lists the formats each part actually has ("formats"); parts without a
+    fused/usd/fused_model.usd are left out of scene.usda.
+
+    Returns:
+        str: Path of scene.json.
+    """
+    folder = os.path.abspath(folder)
+    instances = load_placements(placements, objects) if placements else default_placements(objects)
+    os.makedirs(output_dir, exist_ok=True)
+    cache_dir = join(output_dir, "mesh_cache")
+
+    parts = {}
+    for name in sorted({inst["object"] for inst in instances}):
+        fused = join(folder, name, "fused")
+        cache = build_mesh_cache(folder, name, cache_dir)
+        if cache is None:
+            print(f"\033[33m[ERROR] No fused/obj/fused_model.obj for {name}, skipping its instances.\033[0m")
+            continue
+        part = {
+            "obj": join(fused, "obj", "fused_model.obj"),
+            "usd": join(fused, "usd", "fused_model.usd"),
+            "urdf": join(fused, f"{name}.urdf"),
+            "cache": cache,
+        }
+        part["formats"] = [fmt for fmt in ("obj", "usd", "urdf") if os.path.exists(part[fmt])]
+        for fmt in ("usd", "urdf"):
+            if fmt not in part["formats"]:
+                part[fmt] = None
+        if part["usd"] is None:
+            print(f"\033[33m[WARNING] No fused/usd/fused_model.usd for {name} (usd_mesh in downloader_config.json), "
+                  f"leaving it out of scene.usda.\033[0m")
+        parts[name] = part
+    instances = [inst for inst in instances if inst["object"] in parts]
+    print(f"{len(instances)} instances of {len(parts)} unique parts")
+
+    usd_instances = write_usda(join(output_dir, "scene.usda"), parts, instances, usd_prim)
+    if usd_instances < len(instances):
+        print(f"scene.usda: {usd_instances} of {len(instances)} instances (the others have no USD mesh)")
+    write_sdf(join(output_dir, "scene.sdf"), parts, instances, group_name)
+    scene_path = join(output_dir, "scene.json")
+    with open(scene_path, "w") as f:
+        json.dump({"group": group_name, "parts": parts, "instances": instances}, f, indent=4)
+    return scene_path
+
+
+# =======================
+# PyBullet loading
+# =======================
+def load_scene_pybullet(scene_path, client_id=0):
+    """
+    Load a scene.json into PyBullet, creating the collision and visual shapes once per unique part
+    (collision from the binary mesh cache) and reusing them for every instance.
+
+    Returns:
+        dict: instance name -> body id
+    """
+    with open(scene_path, "r") as f:
+        scene = json.load(f)
+    shapes = {}
+    for name, part in scene["parts"].items():
+        vertices = np.load(part["cache"])["vertices"]
+        collision = pybullet.createCollisionShape(pybullet.GEOM_MESH, vertices=vertices.tolist(),
+                                                  physicsClientId=client_id)
+        visual = pybullet.createVisualShape(pybullet.GEOM_MESH, fileName=part["obj"], physicsClientId=client_id)
+        shapes[name] = (collision, visual)
+    bodies = {}
+    for inst in scene["instances"]:
+        collision, visual = shapes[inst["object"]]
+        body = pybullet.createMultiBody(baseMass=MASS, baseCollisionShapeIndex=collision,
+                                        baseVisualShapeIndex=visual, basePosition=inst["xyz"],
+                                        baseOrientation=pybullet.getQuaternionFromEuler(inst["rpy"]),
+                                        physicsClientId=client_id)
+        pybullet.changeDynamics(body, -1, lateralFriction=LATERAL_FRICTION, spinningFriction=SPINNING_FRICTION,
+                                rollingFriction=ROLLING_FRICTION, localInertiaDiagonal=[INERTIA] * 3,
+                                physicsClientId=client_id)
+        bodies[inst["name"]] = body
+    return bodies
+
+
+def load_urdfs_pybullet(scene_path, client_id=0):
+    """Baseline: load each instance from its per-object URDF (create_urdf_files.py)."""
+    with open(scene_path, "r") as f:
+        scene = json.load(f)
+    missing = sorted(name for name, part in scene["parts"].items() if part["urdf"] is None)
+    if missing:
+        raise RuntimeError(f"No URDF for {', '.join(missing)}, run create_urdf_files.py first")
+    bodies = {}
+    for inst in scene["instances"]:
+        bodies[inst["name"]] = pybullet.loadURDF(scene["parts"][inst["object"]]["urdf"], inst["xyz"],
+                                                 pybullet.getQuaternionFromEuler(inst["rpy"]),
+                                                 physicsClientId=client_id)
+    return bodies
+
+
+def benchmark_load(scene_path, repeats=3):
+    """Compare PyBullet load time of the instanced scene against loading the per-object URDFs."""
+    if pybullet is None:
+        raise RuntimeError("pybullet is not installed")
+    results = {}
+    for label, loader in (("per_object_urdf", load_urdfs_pybullet), ("instanced_scene", load_scene_pybullet)):
+        times = []
+        for _ in range(repeats):
+            client = pybullet.connect(pybullet.DIRECT)
+            start = time.perf_counter()
+            bodies = loader(scene_path, client)
+            times.append(time.perf_counter() - start)
+            pybullet.disconnect(client)
+        results[label] = {"min_s": min(times), "median_s": float(np.median(times)), "bodies": len(bodies)}
+    results["speedup"] = results["per_object_urdf"]["median_s"] / results["instanced_scene"]["median_s"]
+    return results
+
+
+# === MAIN ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an assembly scene (USD / SDF / PyBullet) for an ATB group with shared part meshes.")
+    parser.add_argument("--folder", default="data", help="Downloaded dataset root")
+    parser.add_argument("--group", required=True, help="Object group from config/objects.json (e.g. atb1)")
+    parser.add_argument("--placements", default=None, help="Placement JSON; default places each group object once on a grid")
+    parser.add_argument("--output-dir", default=None, help="Default: <folder>/_scenes/<group>")
+    parser.add_argument("--usd-prim", default=None, help="Prim path to reference in each fused_model.usd (default: its defaultPrim)")
+    parser.add_argument("--benchmark", action="store_true", help="Compare PyBullet load time against the per-object URDFs")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    config_directory = join(os.path.dirname(os.path.realpath(__file__)), "../config")
+    with open(join(config_directory, "objects.json"), "r") as f:
+        groups = json.load(f)
+    if args.group not in groups:
+        print(f"Object list ID \"{args.group}\" not found in objects.json")
+        sys.exit(1)
+
+    output_dir = args.output_dir or join(args.folder, "_scenes", args.group)
+    scene_path = build_scene(args.folder, args.group, groups[args.group], output_dir, args.placements, args.usd_prim)
+    print(f"✅ Scene written to {output_dir}")
+
+    if args.benchmark:
+        if pybullet is None:
+            print("pybullet is not installed, skipping load benchmark")
+            sys.exit(1)
+        print(json.dumps(benchmark_load(scene_path, args.repeats), indent=4))
@@ -0,0 +1,80 @@
+import re
+
+# Optional OpenCascade bindings (OCP from cadquery, or pythonocc-core) for STEP tessellation
+try:
+    from OCP.STEPControl import STEPControl_Reader
+    from OCP.BRepMesh import BRepMesh_IncrementalMesh
+    from OCP.StlAPI import StlAPI_Writer
+    from OCP.IFSelect import IFSelect_RetDone
+except ImportError:
+    try:
+        from OCC.Core.STEPControl import STEPControl_Reader
+        from OCC.Core.BRepMesh import BRepMesh_IncrementalMesh
+        from OCC.Core.StlAPI import StlAPI_Writer
+        from OCC.Core.IFSelect import IFSelect_RetDone
+    except ImportError:
+        STEPControl_Reader = None
+
+CAD_EXTENSIONS = (".stl", ".step", ".stp")
+STEP_EXTENSIONS = (".step", ".stp")
+
+# Metres per unit
+UNIT_SCALE = {
+    "um": 1e-6, "micron": 1e-6,
+    "mm": 0.001, "millimeter": 0.001, "millimeters": 0.001, "millimetre": 0.001, "millimetres": 0.001,
+    "cm": 0.01, "centimeter": 0.01, "centimeters": 0.01,
+    "m": 1.0, "meter": 1.0, "meters": 1.0, "metre": 1.0, "metres": 1.0,
+    "in": 0.0254, "inch": 0.0254, "inches": 0.0254,
+    "ft": 0.3048, "foot": 0.3048, "feet": 0.3048,
+}
+# STL has no unit field; our CAD exports are in millimetres unless the header says otherwise
+DEFAULT_STL_UNIT = "mm"
+# Chordal deflection (metres) used for STEP when no tolerance budget is given
+DEFAULT_TESSELLATION_TOLERANCE = 1e-4
+_UNIT_RE = re.compile(rb"UNITS?\s*[=:]\s*([A-Za-z]+)", re.IGNORECASE)
+
+
+def stl_unit(path):
+    """
+    Read the unit of an STL file from its header (binary: the 80 byte header, ASCII: the
+    'solid' line), e.g. 'UNITS=mm' as written by several CAD exporters.
+
+    Returns:
+        tuple: (unit name, metres per unit, True if the unit was found in the file)
+    """
+    with open(path, "rb") as f:
+        header = f.read(80)
+    if header.lstrip().lower().startswith(b"solid"):
+        with open(path, "rb") as f:
+            header = f.readline(1024)
+    match = _UNIT_RE.search(header)
+    if match:
+        unit = match.group(1).decode("ascii").lower()
+        if unit in UNIT_SCALE:
+            return unit, UNIT_SCALE[unit], True
+    return DEFAULT_STL_UNIT, UNIT_SCALE[DEFAULT_STL_UNIT], False
+
+
+def tessellate_step(step_path, stl_path, tolerance, angular_tolerance=0.5):
+    """
+    Tessellate a STEP file into an STL with OpenCascade. STEP geometry is read in millimetres
+    (OpenCascade's default), so the chordal `tolerance` (metres) is converted accordingly.
+
+    Returns:
+        tuple: (unit name, metres per unit) of the written STL.
+    """
+    if STEPControl_Reader is None:
+        raise RuntimeError("STEP support needs OpenCascade Python bindings (pip install cadquery-ocp or pythonocc-core)")
+    reader = STEPControl_Reader()
+    if reader.ReadFile(str(step_path)) != IFSelect_RetDone:
+        raise RuntimeError(f"Could not read STEP file: {step_path}")
+    reader.TransferRoots()
+    shape = reader.OneShape()
+    mesh = BRepMesh_IncrementalMesh(shape, tolerance / UNIT_SCALE["mm"], False, angular_tolerance, True)
+    mesh.Perform()
+    writer = StlAPI_Writer()
+    if hasattr(writer, "SetASCIIMode"):
+        writer.SetASCIIMode(False)
+    if not writer.Write(shape, str(stl_path)):
+        raise RuntimeError(f"Could not write STL: {stl_path}")
+    return "mm", UNIT_SCALE["mm"]
@@ -37,36 +37,60 @@ URDF_TEMPLATE = """<?xml version="0.0" ?>
 </robot>
 """
 
-def main():
-    # Parse command line inputs
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--folder", type=Path, default=Path("data"))
-    args = parser.parse_args()
+def create_urdf_file(object_dir):
+    """
+    Write a URDF file into the fused/ directory of one object folder.
 
-    if not args.folder.exists():
-        raise RuntimeError(f"Root dir does not exist: {args.folder}")
+    Returns:
+        Path: Path of the URDF file, or None if the object has no fused/ directory.
+    """
+    object_dir = Path(object_dir)
+    folder_name = object_dir.name
 
-    for item in args.folder.iterdir():
-        if not item.is_dir():
-            continue
-            
-        folder_name = item.name
+    fused_dir = object_dir / "fused"
+    # Check if fused dir exists
+    if not os.path.exists(fused_dir):
+        print(f"\033[33m[ERROR] 'fused' directory does not exist for {object_dir}.\033[0m]")
+        return None
 
-        fused_dir = item / "fused"
-        # Check if fused dir exists
-        if not os.path.exists(fused_dir):
-            print(f"\033[33m[ERROR] 'fused' directory does not exist for {item}.\033[0m]")
-            continue
+    # Create filename based on object folder name
+    urdf_filename = f"{folder_name}.urdf"
+    urdf_path = fused_dir / urdf_filename
+
+    urdf_text = URDF_TEMPLATE.format(robot_name=folder_name)
+
+    # write urdf
+    urdf_path.write_text(urdf_text)
+    print(f"Created: {urdf_path}")
+    return urdf_path
 
-        # Create filename based on object folder name
-        urdf_filename = f"{folder_name}.urdf"
-        urdf_path = fused_dir / urdf_filename
+def create_urdf_files(folder):
+    """
+    Write a URDF file into the fused/ directory of every object folder under `folder`.
 
-        urdf_text = URDF_TEMPLATE.format(robot_name=folder_name)
+    Returns:
+        list[Path]: Paths of the URDF files that were written.
+    """
+    folder = Path(folder)
+    if not folder.exists():
+        raise RuntimeError(f"Root dir does not exist: {folder}")
+
+    created = []
+    for item in folder.iterdir():
+        if not item.is_dir():
+            continue
+        urdf_path = create_urdf_file(item)
+        if urdf_path is not None:
+            created.append(urdf_path)
+    return created
+
+def main():
+    # Parse command line inputs
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--folder", type=Path, default=Path("data"))
+    args = parser.parse_args()
 
-        # write urdf
-        urdf_path.write_text(urdf_text)
-        print(f"Created: {urdf_path}")
+    create_urdf_files(args.folder)
 
 if __name__ == "__main__":
     main()
@@ -7,6 +7,8 @@ import boto3
 from botocore import UNSIGNED
 from botocore.client import Config
 
+from blob_store import store_from_config
+
 def folder_has_expected_files(local_dir, expected_count=360):
     """Check if a local directory already has the expected number of files."""
     if not os.path.isdir(local_dir):
@@ -17,9 +19,11 @@ def folder_has_expected_files(local_dir, expected_count=360):
 
 
 class MOADv2_Downloader:
-    def __init__(self, config, object_list):
+    def __init__(self, config, object_list, on_object_complete=None):
         self.config = config
         self.object_list = object_list
+        # Optional callback(object_name, local_dir), called as soon as each object has finished downloading
+        self.on_object_complete = on_object_complete
         
         # Setup target directory
         self.target_dir = config["target_directory"]
@@ -34,6 +38,11 @@ class MOADv2_Downloader:
         self.bucket_name = "moadv2"
         self.start_s3_client()
 
+        # Optional content-addressed store shared between target directories
+        self.blob_store = store_from_config(config)
+        if self.blob_store is not None:
+            print(f"Blob Store: {self.blob_store.root} (link mode: {self.blob_store.link_mode})")
+
     def start_s3_client(self):
         if self.config["download_unsigned"]:
             # Anonymous S3 client (no credentials needed)
@@ -63,13 +72,28 @@ class MOADv2_Downloader:
                     pose_folders.add(folder_name)
         return sorted(pose_folders)
     
-    def download_file(self, s3_key, local_path):
+    def download_file(self, s3_key, local_path, etag=None):
         os.makedirs(os.path.dirname(local_path), exist_ok=True)
         if os.path.exists(local_path):
             print(f"⏭️ Skipping {local_path} (already exists)",end="\t\t\t\r")
             return
-        print(f"⬇️  Downloading s3://{self.bucket_name}/{s3_key} → {local_path}",end="\t\t\t\r")
-        self.s3.download_file(self.bucket_name, s3_key, local_path)
+        if self.blob_store is None:
+            print(f"⬇️  Downloading s3://{self.bucket_name}/{s3_key} → {local_path}",end="\t\t\t\r")
+            self.s3.download_file(self.bucket_name, s3_key, local_path)
+            return
+
+        # Blob store: reuse a previous download of the same content if we have one
+        if etag is None:
+            etag = self.s3.head_object(Bucket=self.bucket_name, Key=s3_key)["ETag"]
+        sha = self.blob_store.lookup_etag(etag)
+        if sha is None:
+            print(f"⬇️  Downloading s3://{self.bucket_name}/{s3_key} → blob store",end="\t\t\t\r")
+            tmp_path = self.blob_store.temp_path()
+            self.s3.download_file(self.bucket_name, s3_key, tmp_path)
+            sha = self.blob_store.ingest(tmp_path, etag)
+        else:
+            print(f"🔗 Linking {local_path} from blob store",end="\t\t\t\r")
+        self.blob_store.materialize(sha, local_path, self.target_dir)
 
     def download_prefix(self, prefix, local_root):
         file_found = False
@@ -79,7 +103,7 @@ class MOADv2_Downloader:
                 s3_key = obj["Key"]
                 rel_path = os.path.relpath(s3_key, prefix)
                 local_path = os.path.join(local_root, rel_path)
-                self.download_file(s3_key, local_path)
+                self.download_file(s3_key, local_path, obj.get("ETag"))
                 file_found = True
         if not file_found: print("File not found.")
 
@@ -88,10 +112,6 @@ class MOADv2_Downloader:
         Download datasets from S3 based on config rules.
         """
         data_cfg = self.config["data_to_download"]
-        if data_cfg.get("rgb", False):
-            print("WARNING: RGB data can take a long time to download, continue? (This can be configured in downloader_config.json)")
-            input("YES: [Enter]\t\tNO: [Ctrl+C]")
-            
         for obj in self.object_list:
             obj_name = obj
             download_start = time.time()
@@ -170,7 +190,7 @@ class MOADv2_Downloader:
                             if key.endswith("_cloud.ply"):
                                 rel_path = os.path.relpath(key, obj_prefix)
                                 local_path = os.path.join(obj_local, rel_path)
-                                self.download_file(key, local_path)
+                                self.download_file(key, local_path, obj.get("ETag"))
 
                 # raw_mesh → fused/*_mesh.ply
                 if fused_cfg.get("raw_mesh", False):
@@ -181,7 +201,7 @@ class MOADv2_Downloader:
                             if key.endswith("_mesh.ply"):
                                 rel_path = os.path.relpath(key, obj_prefix)
                                 local_path = os.path.join(obj_local, rel_path)
-                                self.download_file(key, local_path)
+                                self.download_file(key, local_path, obj.get("ETag"))
 
                 # obj_mesh → all contents of fused/obj/
                 if fused_cfg.get("obj_mesh", False):
@@ -202,6 +222,8 @@ class MOADv2_Downloader:
 
             time_elapsed = time.time() - download_start
             print(f"\n\n✅ Finished {obj_name} in {timedelta(seconds=time_elapsed)}")
+            if self.on_object_complete is not None:
+                self.on_object_complete(obj_name, obj_local)
         print("\n\n== Finished All Objects ==")
 
 # === MAIN === 
@@ -235,6 +257,10 @@ if __name__ == "__main__":
         # TODO: Allow a list of specific object names to be passed
         print(f"Object list ID \"{to_download}\" not found in objects.json")
         exit()
+    if config["data_to_download"].get("rgb", False):
+        print("WARNING: RGB data can take a long time to download, continue? (This can be configured in downloader_config.json)")
+        input("YES: [Enter]\t\tNO: [Ctrl+C]")
+
     # Assemble list of objects to download
     downloader = MOADv2_Downloader(config,objects)
 
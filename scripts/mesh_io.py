@@ -0,0 +1,182 @@
+import os
+import numpy as np
+
+# PLY scalar type names -> numpy dtype codes
+PLY_TYPES = {
+    "char": "i1", "int8": "i1",
+    "uchar": "u1", "uint8": "u1",
+    "short": "i2", "int16": "i2",
+    "ushort": "u2", "uint16": "u2",
+    "int": "i4", "int32": "i4",
+    "uint": "u4", "uint32": "u4",
+    "float": "f4", "float32": "f4",
+    "double": "f8", "float64": "f8",
+}
+
+
+def _read_ply_header(f):
+    """
+    Parse a PLY header from an open binary file.
+
+    Returns:
+        tuple: (format string, list of elements) where each element is a dict
+        with 'name', 'count' and 'props' (list of (name, dtype) or
+        (name, count_dtype, item_dtype) for list properties).
+    """
+    if f.readline().strip() != b"ply":
+        raise ValueError("Not a PLY file")
+    fmt = None
+    elements = []
+    while True:
+        line = f.readline()
+        if not line:
+            raise ValueError("Unexpected end of file in PLY header")
+        parts = line.decode("ascii", errors="replace").split()
+        if not parts or parts[0] in ("comment", "obj_info"):
+            continue
+        if parts[0] == "format":
+            fmt = parts[1]
+        elif parts[0] == "element":
+            elements.append({"name": parts[1], "count": int(parts[2]), "props": []})
+        elif parts[0] == "property":
+            if parts[1] == "list":
+                elements[-1]["props"].append((parts[4], PLY_TYPES[parts[2]], PLY_TYPES[parts[3]]))
+            else:
+                elements[-1]["props"].append((parts[2], PLY_TYPES[parts[1]]))
+        elif parts[0] == "end_header":
+            break
+    return fmt, elements
+
+
+def _read_binary_faces(f, element, endian):
+    """Read a face element, using a fixed-stride fast path when every face is a triangle."""
+    count = element["count"]
+    props = element["props"]
+    # Fast path: single list property of triangles
+    if len(props) == 1 and len(props[0]) == 3:
+        _, count_dt, item_dt = props[0]
+        row = np.dtype([("n", endian + count_dt), ("idx", endian + item_dt, (3,))])
+        start = f.tell()
+        data = np.frombuffer(f.read(row.itemsize * count), dtype=row, count=count)
+        if len(data) == count and np.all(data["n"] == 3):
+            return data["idx"].astype(np.int32)
+        f.seek(start)
+    # Slow path: general polygons, fan-triangulated
+    faces = []
+    for _ in range(count):
+        polys = []
+        for prop in props:
+            if len(prop) == 3:
+                _, count_dt, item_dt = prop
+                n = int(np.frombuffer(f.read(np.dtype(count_dt).itemsize), dtype=endian + count_dt)[0])
+                idx = np.frombuffer(f.read(np.dtype(item_dt).itemsize * n), dtype=endian + item_dt)
+                if prop[0] in ("vertex_indices", "vertex_index"):
+                    polys = idx
+            else:
+                f.read(np.dtype(prop[1]).itemsize)
+        for i in range(1, len(polys) - 1):
+            faces.append((polys[0], polys[i], polys[i + 1]))
+    return np.asarray(faces, dtype=np.int32).reshape(-1, 3)
+
+
+def read_ply(path):
+    """
+    Read a PLY point cloud or mesh (ascii or binary).
+
+    Args:
+        path (str): Path to the .ply file.
+
+    Returns:
+        tuple: (points (N,3) float32, colors (N,3) uint8 or None, faces (F,3) int32 or None)
+    """
+    with open(path, "rb") as f:
+        fmt, elements = _read_ply_header(f)
+        points = colors = faces = None
+        for element in elements:
+            if fmt == "ascii":
+                rows = [f.readline().split() for _ in range(element["count"])]
+                if element["name"] == "vertex":
+                    names = [p[0] for p in element["props"]]
+                    data = np.asarray(rows, dtype=np.float64).reshape(-1, len(names))
+                    vertex = {n: data[:, i] for i, n in enumerate(names)}
+                elif element["name"] == "face":
+                    tris = []
+                    for r in rows:
+                        idx = [int(v) for v in r[1:int(r[0]) + 1]]
+                        tris.extend((idx[0], idx[i], idx[i + 1]) for i in range(1, len(idx) - 1))
+                    faces = np.asarray(tris, dtype=np.int32).reshape(-1, 3)
+                    continue
+                else:
+                    continue
+            else:
+                endian = "<" if fmt == "binary_little_endian" else ">"
+                if element["name"] == "face":
+                    faces = _read_binary_faces(f, element, endian)
+                    continue
+                if any(len(p) == 3 for p in element["props"]):
+                    raise ValueError(f"List properties not supported on element '{element['name']}'")
+                dtype = np.dtype([(p[0], endian + p[1]) for p in element["props"]])
+                data = np.frombuffer(f.read(dtype.itemsize * element["count"]), dtype=dtype)
+                if element["name"] != "vertex":
+                    continue
+                vertex = {n: data[n] for n in dtype.names}
+
+            points = np.stack([vertex["x"], vertex["y"], vertex["z"]], axis=1).astype(np.float32)
+            if all(c in vertex for c in ("red", "green", "blue")):
+                colors = np.stack([vertex["red"], vertex["green"], vertex["blue"]], axis=1).astype(np.uint8)
+    return points, colors, faces
+
+
+def write_ply(path, points, colors=None, faces=None):
+    """
+    Write a binary little endian PLY file with float xyz, optional uchar rgb and optional triangle faces.
+    """
+    points = np.asarray(points, dtype=np.float32)
+    header = ["ply", "format binary_little_endian 1.0", f"element vertex {len(points)}",
+              "property float x", "property float y", "property float z"]
+    fields = [("x", "<f4"), ("y", "<f4"), ("z", "<f4")]
+    if colors is not None:
+        header += ["property uchar red", "property uchar green", "property uchar blue"]
+        fields += [("red", "u1"), ("green", "u1"), ("blue", "u1")]
+    if faces is not None:
+        header += [f"element face {len(faces)}", "property list uchar int vertex_indices"]
+    header.append("end_header")
+
+    vertex = np.empty(len(points), dtype=np.dtype(fields))
+    vertex["x"], vertex["y"], vertex["z"] = points[:, 0], points[:, 1], points[:, 2]
+    if colors is not None:
+        colors = np.asarray(colors, dtype=np.uint8)
+        vertex["red"], vertex["green"], vertex["blue"] = colors[:, 0], colors[:, 1], colors[:, 2]
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(("\n".join(header) + "\n").encode("ascii"))
+        f.write(vertex.tobytes())
+        if faces is not None:
+            face = np.empty(len(faces), dtype=np.dtype([("n", "u1"), ("idx", "<i4", (3,))]))
+            face["n"] = 3
+            face["idx"] = faces
+            f.write(face.tobytes())
+
+
+def read_obj(path):
+    """
+    Read vertex positions and (fan-triangulated) faces from a Wavefront OBJ file.
+
+    Returns:
+        tuple: (vertices (N,3) float32, faces (F,3) int32)
+    """
+    vertices = []
+    faces = []
+    with open(path, "r") as f:
+        for line in f:
+            if line.startswith("v "):
+                vertices.append(line.split()[1:4])
+            elif line.startswith("f "):
+                # Indices may be 'v', 'v/vt', 'v//vn' or 'v/vt/vn', and may be negative
+                idx = [int(tok.split("/")[0]) for tok in line.split()[1:]]
+                idx = [i - 1 if i > 0 else len(vertices) + i for i in idx]
+                faces.extend((idx[0], idx[i], idx[i + 1]) for i in range(1, len(idx) - 1))
+    return (np.asarray(vertices, dtype=np.float32).reshape(-1, 3),
+            np.asarray(faces, dtype=np.int32).reshape(-1, 3))
+
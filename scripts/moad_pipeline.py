@@ -0,0 +1,289 @@
+import os
+from os.path import join
+import sys
+import re
+import glob
+import json
+import time
+import queue
+import argparse
+import threading
+from datetime import datetime, timedelta
+
+import blender_batch_convert_ply as ply_convert
+from create_urdf_files import create_urdf_file
+from stage_metrics import load_stage_records, summarize_stages, print_stage_summary
+
+_STOP = object()
+# In-progress downloads: LocalS3Client / blob store style "*.part", and boto3 (s3transfer) "<name>.<8 hex digits>"
+_TEMP_FILE_RE = re.compile(r"(\.part|\.[0-9a-fA-F]{8})$")
+
+
+def find_object_mesh(object_dir):
+    """The fused/*_mesh.ply of an object, or None (the first one if there are several)."""
+    matches = sorted(glob.glob(join(object_dir, "fused", "*_mesh.ply")))
+    return matches[0] if matches else None
+
+
+class StreamingPipeline:
+    """
+    Converts objects (Blender cleanup/bake/export, then URDF generation) while the rest of the
+    set is still downloading. Objects are submitted as they complete, either by the downloader's
+    `on_object_complete` callback or by `watch_directory`, into a bounded queue consumed by
+    `workers` conversion threads. When the queue is full, `submit` blocks, which pauses the
+    downloader instead of piling up unconverted objects.
+
+    Usage:
+        pipeline = StreamingPipeline(target_dir, workers=2)
+        pipeline.start()
+        MOADv2_Downloader(config, objects, on_object_complete=pipeline.on_object_complete).download_objects()
+        pipeline.close()
+    """
+    def __init__(self, target_dir, workers=1, queue_size=None, blender_threads=None, auto_skip=True):
+        self.target_dir = os.path.abspath(target_dir)
+        self.workers = workers
+        self.auto_skip = auto_skip
+        # Leave a core for the downloader and split the rest between the Blender instances
+        self.blender_threads = blender_threads or max(1, ((os.cpu_count() or 1) - 1) // workers)
+        self.queue = queue.Queue(maxsize=queue_size or 2 * workers)
+        self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.log_dir = join(self.target_dir, "_blender_logs", f"{self.timestamp}_pipeline")
+        self.results = []
+        self._seen = set()
+        self._lock = threading.Lock()
+        self._threads = []
+        self.start_time = None
+
+    def start(self):
+        ply_convert.check_conversion_script()
+        os.makedirs(self.log_dir, exist_ok=True)
+        self.start_time = time.time()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"convert-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, object_dir):
+        """Queue an object folder for processing (once). Blocks while the queue is full."""
+        object_dir = os.path.abspath(object_dir)
+        with self._lock:
+            if object_dir in self._seen:
+                return False
+            self._seen.add(object_dir)
+        self.queue.put((object_dir, time.time()))
+        print(f"\n📥 Queued {os.path.basename(object_dir)} ({self.queue.qsize()} waiting)")
+        return True
+
+    def seen(self, object_dir):
+        """True if the object folder has already been submitted."""
+        with self._lock:
+            return os.path.abspath(object_dir) in self._seen
+
+    def on_object_complete(self, object_name, object_dir):
+        """Callback for MOADv2_Downloader."""
+        self.submit(object_dir)
+
+    def close(self):
+        """Wait for all queued objects to be processed and stop the workers."""
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is _STOP:
+                    return
+                object_dir, queued_at = item
+                try:
+                    result = self.process_object(object_dir)
+                except Exception as e:
+                    result = {"object": os.path.basename(object_dir), "status": "fail", "error": str(e)}
+                result["queue_wait_s"] = result.get("start", time.time()) - queued_at
+                with self._lock:
+                    self.results.append(result)
+            finally:
+                self.queue.task_done()
+
+    def process_object(self, object_dir):
+        """Convert one object's fused mesh (unless already processed) and write its URDF."""
+        object_name = os.path.basename(object_dir)
+        result = {"object": object_name, "start": time.time(), "convert_s": 0.0, "urdf_s": 0.0}
+        mesh = find_object_mesh(object_dir)
+        if mesh is None and not os.path.isdir(join(object_dir, "fused", "obj")):
+            print(f"\033[33m[ERROR] No fused mesh for {object_name}, skipping.\033[0m")
+            result["status"] = "no_mesh"
+            return result
+
+        if mesh is not None and not (self.auto_skip and ply_convert.already_processed(mesh)):
+            metrics_path = join(self.log_dir, f"{object_name}.jsonl")
+            elapsed, success = ply_convert.run_blender(mesh, metrics_path, threads=self.blender_threads,
+                                                       log_path=join(self.log_dir, f"{object_name}.log"))
+            result.update(convert_s=elapsed, metrics=metrics_path)
+            if not success:
+                result["status"] = "fail"
+                return result
+            result["status"] = "converted"
+        else:
+            print(f"⏭️ {object_name} already processed, skipping conversion")
+            result["status"] = "skipped"
+
+        start = time.time()
+        create_urdf_file(object_dir)
+        result["urdf_s"] = time.time() - start
+        return result
+
+    def summary(self, download_s=None):
+        wall = time.time() - self.start_time
+        stage_records = []
+        for r in self.results:
+            if r.get("metrics"):
+                stage_records.extend(load_stage_records(r["metrics"]))
+        return {
+            "wall_s": wall,
+            "download_s": download_s,
+            "convert_busy_s": sum(r["convert_s"] + r["urdf_s"] for r in self.results if "convert_s" in r),
+            "workers": self.workers,
+            "blender_threads": self.blender_threads,
+            "objects": sorted(self.results, key=lambda r: r["start"] if "start" in r else 0),
+            "stages": summarize_stages(stage_records),
+        }
+
+    def write_summary(self, download_s=None):
+        summary = self.summary(download_s)
+        path = join(self.target_dir, "_blender_logs", f"{self.timestamp}_pipeline_summary.json")
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=4)
+        counts = {}
+        for r in summary["objects"]:
+            counts[r["status"]] = counts.get(r["status"], 0) + 1
+        print(f"\n📊 Objects: {counts}")
+        if summary["stages"]:
+            print("\n⏱️  Per-stage summary:")
+            print_stage_summary(summary["stages"])
+        if download_s is not None:
+            print(f"\nDownload: {timedelta(seconds=download_s)}")
+        print(f"Conversion busy time: {timedelta(seconds=summary['convert_busy_s'])} over {self.workers} worker(s)")
+        print(f"Pipeline wall time: {timedelta(seconds=summary['wall_s'])}")
+        print(f"📄 Summary written to {path}")
+        return summary
+
+
+# -----------------------
+# Filesystem watcher
+# -----------------------
+def object_activity(object_dir):
+    """
+    Snapshot of everything under an object folder.
+
+    Returns:
+        tuple: ((file count, total bytes, newest mtime), True if a download is still in progress)
+    """
+    count, size, newest, busy = 0, 0, 0.0, False
+    for dirpath, _, filenames in os.walk(object_dir):
+        for name in filenames:
+            try:
+                st = os.stat(join(dirpath, name))
+            except FileNotFoundError:
+                busy = True  # renamed or removed under us
+                continue
+            count += 1
+            size += st.st_size
+            newest = max(newest, st.st_mtime)
+            busy = busy or bool(_TEMP_FILE_RE.search(name))
+    return (count, size, newest), busy
+
+
+def watch_directory(target_dir, pipeline, poll_interval=5.0, stable_polls=2, idle_timeout=None, stop_event=None):
+    """
+    Poll `target_dir` for objects that have a fused/*_mesh.ply and whose whole folder has stayed
+    unchanged (same file count, total size and newest mtime, no temporary download files) for
+    `stable_polls` consecutive polls, and submit them to the pipeline. Waiting for the whole
+    folder keeps conversion from writing fused/obj and fused/usd while the downloader still is.
+    Returns after `idle_timeout` seconds without a new object, when `stop_event` is set, or on Ctrl+C.
+    """
+    last_seen = {}
+    stable = {}
+    last_new = time.time()
+    try:
+        while stop_event is None or not stop_event.is_set():
+            for entry in os.scandir(target_dir):
+                if not entry.is_dir() or entry.name.startswith("_") or pipeline.seen(entry.path):
+                    continue
+                if find_object_mesh(entry.path) is None:
+                    continue
+                sig, busy = object_activity(entry.path)
+                if busy or last_seen.get(entry.path) != sig:
+                    stable[entry.path] = 0
+                else:
+                    stable[entry.path] = stable.get(entry.path, 0) + 1
+                last_seen[entry.path] = sig
+                if stable[entry.path] >= stable_polls:
+                    pipeline.submit(entry.path)
+                    last_new = time.time()
+            if idle_timeout is not None and time.time() - last_new > idle_timeout:
+                print(f"\nNo new objects for {idle_timeout:.0f} s, stopping watcher.")
+                return
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print("\nWatcher stopped.")
+
+
+# === MAIN ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download and convert MOADv2 objects as a streaming pipeline.")
+    parser.add_argument("--watch", default=None, metavar="DIR",
+                        help="Don't download; watch DIR for objects whose fused mesh has finished arriving")
+    parser.add_argument("--workers", type=int, default=1, help="Concurrent Blender conversions")
+    parser.add_argument("--queue-size", type=int, default=None, help="Objects waiting for conversion before the download pauses (default: 2 x workers)")
+    parser.add_argument("--blender", default=ply_convert.BLENDER_PATH, help="Blender executable")
+    parser.add_argument("--reconvert", action="store_true", help="Also convert objects that already have processed outputs")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="Watch mode: seconds between scans")
+    parser.add_argument("--idle-timeout", type=float, default=None, help="Watch mode: stop after this many seconds without new objects")
+    parser.add_argument("--yes", action="store_true", help="Don't ask for confirmation")
+    args = parser.parse_args()
+    ply_convert.BLENDER_PATH = args.blender
+
+    if args.watch:
+        pipeline = StreamingPipeline(args.watch, args.workers, args.queue_size, auto_skip=not args.reconvert)
+        pipeline.start()
+        print(f"👀 Watching {pipeline.target_dir} (Ctrl+C to stop)")
+        watch_directory(args.watch, pipeline, args.poll_interval, idle_timeout=args.idle_timeout)
+        pipeline.close()
+        pipeline.write_summary()
+        sys.exit(0)
+
+    from download_moad import MOADv2_Downloader
+    config_directory = join(os.path.dirname(os.path.realpath(__file__)), "../config")
+    with open(join(config_directory, "objects.json"), "r") as f:
+        objects = json.load(f)
+    with open(join(config_directory, "downloader_config.json"), "r") as f:
+        config = json.load(f)
+
+    to_download = config["objects_to_download"]
+    if to_download not in objects.keys():
+        print(f"Object list ID \"{to_download}\" not found in objects.json")
+        exit()
+    objects = objects[to_download]
+    print(f"About to download and convert {len(objects)} objects into {config['target_directory']}: ")
+    for o in objects:
+        print(f" > {o}")
+    if not args.yes:
+        input("Continue?: (Ctrl+C to exit)")
+        if config["data_to_download"].get("rgb", False):
+            print("WARNING: RGB data can take a long time to download, continue? (This can be configured in downloader_config.json)")
+            input("YES: [Enter]\t\tNO: [Ctrl+C]")
+
+    pipeline = StreamingPipeline(config["target_directory"], args.workers, args.queue_size, auto_skip=not args.reconvert)
+    downloader = MOADv2_Downloader(config, objects, on_object_complete=pipeline.on_object_complete)
+    pipeline.start()
+
+    # Objects are queued for conversion by the callback as soon as each one completes
+    download_start = time.time()
+    downloader.download_objects()
+    download_s = time.time() - download_start
+    pipeline.close()
+    pipeline.write_summary(download_s)
@@ -0,0 +1,319 @@
+import os
+from os.path import join
+import json
+import time
+import glob
+import shutil
+import argparse
+import tracemalloc
+import numpy as np
+
+from mesh_io import read_ply
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".pcc"
+MORTON_BITS = 21  # bits per axis, 63 bit codes
+CHUNK_DTYPE = np.dtype([
+    ("code", "<u8"),        # Morton code of the octree cell at `depth`
+    ("start", "<u8"),       # first point index of the chunk
+    ("count", "<u4"),       # number of points in the chunk
+    ("min", "<f4", (3,)),   # tight bounds of the chunk, used for dequantization
+    ("max", "<f4", (3,)),
+])
+
+
+# =======================
+# Morton ordering
+# =======================
+def _part1by2(x):
+    """Spread the low 21 bits of x so there are two zero bits between each."""
+    x = x.astype(np.uint64) & np.uint64(0x1fffff)
+    x = (x | (x << np.uint64(32))) & np.uint64(0x1f00000000ffff)
+    x = (x | (x << np.uint64(16))) & np.uint64(0x1f0000ff0000ff)
+    x = (x | (x << np.uint64(8))) & np.uint64(0x100f00f00f00f00f)
+    x = (x | (x << np.uint64(4))) & np.uint64(0x10c30c30c30c30c3)
+    x = (x | (x << np.uint64(2))) & np.uint64(0x1249249249249249)
+    return x
+
+
+def morton_codes(points, lo, hi):
+    """63 bit Morton codes of points quantized to a 2^21 grid over the box [lo, hi]."""
+    extent = np.maximum(hi - lo, 1e-12)
+    grid = ((points - lo) / extent * ((1 << MORTON_BITS) - 1)).astype(np.uint64)
+    return _part1by2(grid[:, 0]) | (_part1by2(grid[:, 1]) << np.uint64(1)) | (_part1by2(grid[:, 2]) << np.uint64(2))
+
+
+# =======================
+# Writer
+# =======================
+def convert(ply_path, out_dir=None, depth=None, target_chunk_points=50000, seed=0):
+    """
+    Convert a PLY point cloud into a chunked cache directory:
+        header.json   metadata and global bounds
+        chunks.npy    octree cell table (Morton code, point range, bounds) in Morton order
+        points.npy    (N,3) uint16 coordinates, quantized relative to each chunk's bounds
+        colors.npy    (N,3) uint8 colors (if the PLY has colors)
+
+    Points within a chunk are shuffled, so any prefix of a chunk is a uniform subsample:
+    readers can load a coarse level by reading only the first fraction of every chunk.
+
+    Returns:
+        str: Path of the cache directory.
+    """
+    points, colors, _ = read_ply(ply_path)
+    if out_dir is None:
+        out_dir = os.path.splitext(ply_path)[0] + CACHE_SUFFIX
+    n = len(points)
+    if depth is None:
+        depth = int(np.clip(np.ceil(np.log(max(n / target_chunk_points, 1)) / np.log(8)), 1, 10))
+
+    lo, hi = points.min(axis=0).astype(np.float64), points.max(axis=0).astype(np.float64)
+    codes = morton_codes(points.astype(np.float64), lo, hi)
+    order = np.argsort(codes, kind="stable")
+    chunk_codes = codes[order] >> np.uint64(3 * (MORTON_BITS - depth))
+    cell, starts, counts = np.unique(chunk_codes, return_index=True, return_counts=True)
+
+    # Shuffle within each chunk so chunk prefixes are uniform subsamples
+    rng = np.random.default_rng(seed)
+    keys = np.repeat(np.arange(len(cell)), counts) + rng.random(n)
+    order = order[np.argsort(keys, kind="stable")]
+    points = points[order]
+    if colors is not None:
+        colors = colors[order]
+
+    chunks = np.zeros(len(cell), dtype=CHUNK_DTYPE)
+    chunks["code"], chunks["start"], chunks["count"] = cell, starts, counts
+    chunks["min"] = np.minimum.reduceat(points, starts, axis=0)
+    chunks["max"] = np.maximum.reduceat(points, starts, axis=0)
+
+    chunk_of_point = np.repeat(np.arange(len(cell)), counts)
+    cmin = chunks["min"][chunk_of_point].astype(np.float64)
+    extent = chunks["max"][chunk_of_point].astype(np.float64) - cmin
+    scale = np.divide(65535.0, extent, out=np.zeros_like(extent), where=extent > 0)
+    quantized = np.round((points - cmin) * scale).astype(np.uint16)
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(join(out_dir, "points.npy"), quantized)
+    np.save(join(out_dir, "chunks.npy"), chunks)
+    if colors is not None:
+        np.save(join(out_dir, "colors.npy"), colors.astype(np.uint8))
+    header = {
+        "version": CACHE_VERSION,
+        "source": os.path.abspath(ply_path),
+        "points": int(n),
+        "chunks": int(len(cell)),
+        "depth": int(depth),
+        "bounds_min": lo.tolist(),
+        "bounds_max": hi.tolist(),
+        "has_colors": colors is not None,
+        "quantization": "uint16 per-chunk",
+    }
+    with open(join(out_dir, "header.json"), "w") as f:
+        json.dump(header, f, indent=4)
+    return out_dir
+
+
+# =======================
+# Reader
+# =======================
+class PointCloudCache:
+    """
+    Memory-mapped reader for a cache written by `convert`. Only the chunks covering a query
+    are read from disk; `level` (0-1] reads that fraction of each chunk for a coarse result.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(join(path, "header.json"), "r") as f:
+            self.header = json.load(f)
+        if self.header["version"] != CACHE_VERSION:
+            raise ValueError(f"Unsupported cache version {self.header['version']} in {path}")
+        self.chunks = np.load(join(path, "chunks.npy"))
+        self.points = np.load(join(path, "points.npy"), mmap_mode="r")
+        self.colors = np.load(join(path, "colors.npy"), mmap_mode="r") if self.header["has_colors"] else None
+
+    def __len__(self):
+        return self.header["points"]
+
+    def _read(self, chunk_ids, level=1.0, with_colors=False):
+        """Dequantize (a prefix of) the given chunks. Returns (points float32, colors or None)."""
+        pts, cols = [], []
+        for i in chunk_ids:
+            c = self.chunks[i]
+            start = int(c["start"])
+            n = max(1, int(np.ceil(int(c["count"]) * level)))
+            q = np.asarray(self.points[start:start + n], dtype=np.float32)
+            pts.append(c["min"] + q * ((c["max"] - c["min"]) / 65535.0))
+            if with_colors and self.colors is not None:
+                cols.append(np.asarray(self.colors[start:start + n]))
+        if not pts:
+            return np.empty((0, 3), dtype=np.float32), (np.empty((0, 3), dtype=np.uint8) if with_colors else None)
+        return np.concatenate(pts).astype(np.float32), (np.concatenate(cols) if cols else None)
+
+    def load(self, level=1.0, with_colors=False):
+        """Load the whole cloud (or a coarse `level` of it)."""
+        return self._read(range(len(self.chunks)), level, with_colors)
+
+    def chunks_in_box(self, lo, hi):
+        mask = np.all(self.chunks["max"] >= lo, axis=1) & np.all(self.chunks["min"] <= hi, axis=1)
+        return np.nonzero(mask)[0]
+
+    def chunks_in_radius(self, center, radius):
+        nearest = np.clip(center, self.chunks["min"], self.chunks["max"])
+        return np.nonzero(np.sum((nearest - center) ** 2, axis=1) <= radius * radius)[0]
+
+    def query_box(self, lo, hi, level=1.0, with_colors=False):
+        """Points (and optionally colors) inside the axis aligned box [lo, hi]."""
+        lo, hi = np.asarray(lo, dtype=np.float32), np.asarray(hi, dtype=np.float32)
+        pts, cols = self._read(self.chunks_in_box(lo, hi), level, with_colors)
+        mask = np.all((pts >= lo) & (pts <= hi), axis=1)
+        return pts[mask], (cols[mask] if cols is not None else None)
+
+    def query_radius(self, center, radius, level=1.0, with_colors=False):
+        """Points (and optionally colors) within `radius` of `center`."""
+        center = np.asarray(center, dtype=np.float32)
+        pts, cols = self._read(self.chunks_in_radius(center, radius), level, with_colors)
+        mask = np.sum((pts - center) ** 2, axis=1) <= radius * radius
+        return pts[mask], (cols[mask] if cols is not None else None)
+
+
+def find_clouds(root):
+    """Fused clouds and NeRF pose exports below a dataset root."""
+    patterns = [join(root, "**", "fused", "*_cloud.ply"), join(root, "**", "pose-*", "exports", "*.ply")]
+    return sorted({p for pattern in patterns for p in glob.glob(pattern, recursive=True)})
+
+
+# =======================
+# Benchmark
+# =======================
+def peak_traced_mb(fn):
+    """Peak traced memory (MB) of one run of fn. Kept apart from timing runs, as tracing slows them down."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_cases(ply_path, cache_dir=None, n_queries=100, radius_fraction=0.05, seed=0):
+    """
+    Workloads comparing plain PLY (full parse + KD-tree build) against the chunked cache.
+
+    Returns:
+        tuple: (info dict, {name: fn} to time, {name: fn} to measure peak memory of)
+    """
+    cache_dir = cache_dir or os.path.splitext(ply_path)[0] + CACHE_SUFFIX
+    convert(ply_path, cache_dir, seed=seed)
+    cache = PointCloudCache(cache_dir)
+    points = read_ply(ply_path)[0]
+    tree = cKDTree(points) if cKDTree is not None else None
+
+    rng = np.random.default_rng(seed)
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    radius = float(np.linalg.norm(hi - lo) * radius_fraction)
+    centers = points[rng.integers(0, len(points), size=n_queries)]
+
+    def load_ply():
+        pts = read_ply(ply_path)[0]
+        return pts, (cKDTree(pts) if cKDTree is not None else None)
+
+    def ply_radius():
+        if tree is not None:
+            return [tree.query_ball_point(c, radius) for c in centers]
+        return [np.nonzero(np.sum((points - c) ** 2, axis=1) <= radius * radius)[0] for c in centers]
+
+    def ply_box():
+        return [np.nonzero(np.all((points >= c - radius) & (points <= c + radius), axis=1))[0] for c in centers]
+
+    # Timed conversions go to a scratch directory, the cache queried below stays memory-mapped
+    scratch_dir = cache_dir + ".bench"
+
+    def convert_scratch():
+        convert(ply_path, scratch_dir, seed=seed)
+        shutil.rmtree(scratch_dir)
+
+    info = {
+        "points": int(len(points)),
+        "kdtree": "scipy" if cKDTree is not None else "none (brute force)",
+        "ply_bytes": os.path.getsize(ply_path),
+        "cache_bytes": sum(os.path.getsize(join(cache_dir, f)) for f in os.listdir(cache_dir)),
+        "chunks": cache.header["chunks"],
+        "queries": n_queries,
+        "radius": radius,
+    }
+    timings = {
+        "convert": convert_scratch,
+        "ply_load": load_ply,
+        "ply_radius_queries": ply_radius,
+        "ply_box_queries": ply_box,
+        "cache_open": lambda: PointCloudCache(cache_dir),
+        "cache_coarse_10pct_load": lambda: cache.load(level=0.1),
+        "cache_radius_queries": lambda: [cache.query_radius(c, radius) for c in centers],
+        "cache_box_queries": lambda: [cache.query_box(c - radius, c + radius) for c in centers],
+    }
+    memory = {
+        "ply_load": load_ply,
+        "cache_open": lambda: PointCloudCache(cache_dir),
+        "cache_coarse_10pct_load": lambda: PointCloudCache(cache_dir).load(level=0.1),
+    }
+    return info, timings, memory
+
+
+def benchmark_cache(ply_path, cache_dir=None, n_queries=100, repeats=3, radius_fraction=0.05, seed=0):
+    """Time (median over `repeats` runs) and measure the peak memory of every benchmark case."""
+    results, timings, memory = benchmark_cases(ply_path, cache_dir, n_queries, radius_fraction, seed)
+    for name, fn in timings.items():
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        results[name] = {"repeats": repeats, "min_s": min(times), "median_s": float(np.median(times))}
+    for name, fn in memory.items():
+        results[name]["peak_mb"] = peak_traced_mb(fn)
+    return results
+
+
+# === MAIN ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunked binary point cloud cache for MOADv2 clouds.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_convert = sub.add_parser("convert", help="Convert a PLY file, or every fused/export cloud under a folder")
+    p_convert.add_argument("path")
+    p_convert.add_argument("--depth", type=int, default=None, help="Octree depth of the chunks (default: automatic)")
+    p_convert.add_argument("--chunk-points", type=int, default=50000, help="Target points per chunk when choosing the depth")
+    p_convert.add_argument("--overwrite", action="store_true")
+    p_info = sub.add_parser("info", help="Print a cache header")
+    p_info.add_argument("path")
+    p_bench = sub.add_parser("bench", help="Benchmark a PLY file against its cache")
+    p_bench.add_argument("path")
+    p_bench.add_argument("--queries", type=int, default=100)
+    p_bench.add_argument("--repeats", type=int, default=3)
+    p_bench.add_argument("--output", default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        clouds = [args.path] if os.path.isfile(args.path) else find_clouds(args.path)
+        print(f"Found {len(clouds)} clouds")
+        for ply in clouds:
+            out_dir = os.path.splitext(ply)[0] + CACHE_SUFFIX
+            if os.path.exists(join(out_dir, "header.json")) and not args.overwrite:
+                print(f"⏭️ Skipping {ply} (cache exists)")
+                continue
+            start = time.time()
+            convert(ply, out_dir, depth=args.depth, target_chunk_points=args.chunk_points)
+            print(f"✅ {ply} → {out_dir} ({time.time() - start:.2f}s)")
+    elif args.command == "info":
+        print(json.dumps(PointCloudCache(args.path).header, indent=4))
+    else:
+        results = benchmark_cache(args.path, n_queries=args.queries, repeats=args.repeats)
+        print(json.dumps(results, indent=4))
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=4)
+            print(f"\n📄 Results written to {args.output}")
@@ -0,0 +1,358 @@
+import os
+from os.path import join
+import sys
+import json
+import glob
+import time
+import zlib
+import struct
+import argparse
+from multiprocessing import Pool
+import numpy as np
+
+from mesh_io import read_ply
+
+NEAR_PLANE = 1e-6
+SMALL_TRIANGLE_PX = 8   # triangles with a bbox up to this size are rasterized by direct bbox enumeration
+TILE_PX = 32            # larger triangles are binned into tiles of this size
+MAX_BATCH_ELEMENTS = 1 << 22
+MESH_TRANSFORM_NAME = "mesh_transform.json"  # optional per-pose mesh -> camera frame transform
+
+
+# =======================
+# Image output
+# =======================
+def write_png(path, image):
+    """Write a single channel uint8 or uint16 image as a grayscale PNG (no external dependencies)."""
+    image = np.ascontiguousarray(image)
+    height, width = image.shape
+    bit_depth = 16 if image.dtype == np.uint16 else 8
+    rows = image.astype(">u2" if bit_depth == 16 else "u1").reshape(height, -1).view(np.uint8)
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), rows.reshape(height, -1)], axis=1)
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, bit_depth, 0, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)))
+        f.write(chunk(b"IEND", b""))
+
+
+# =======================
+# Cameras
+# =======================
+def _parse_mesh_transform(data):
+    if "matrix" in data:
+        return np.asarray(data["matrix"], dtype=np.float64)
+    forward = np.eye(4)
+    forward[:3, :] = np.asarray(data["transform"], dtype=np.float64)[:3, :]
+    forward[:3, :] *= data.get("scale", 1.0)
+    return np.linalg.inv(forward)
+
+
+def load_mesh_transform(path, pose_name=None):
+    """
+    Load a 4x4 matrix mapping mesh coordinates into the transforms.json world frame.
+
+    Accepts either {"matrix": 4x4}, applied as is, or a nerfstudio dataparser_transforms.json
+    ({"transform": 3x4, "scale": s}), which maps world -> normalized coordinates; its inverse is
+    applied, for meshes exported in the normalized frame. The file may also map pose folder
+    names to either of these ({"pose-a": {...}, "pose-b": {...}}), in which case `pose_name`
+    selects the entry.
+
+    Returns:
+        tuple: (4x4 matrix, True if the file held a per-pose entry)
+    """
+    with open(path, "r") as f:
+        data = json.load(f)
+    if "matrix" in data or "transform" in data:
+        return _parse_mesh_transform(data), False
+    if pose_name not in data:
+        raise ValueError(f"{path} has no transform for {pose_name} (found: {sorted(data)})")
+    return _parse_mesh_transform(data[pose_name]), True
+
+
+def resolve_pose_transform(pose_dir, mesh_transform=None, n_poses=1, shared_frame=False):
+    """
+    Mesh -> camera frame transform for one pose folder. The object is repositioned between
+    poses, so the fused mesh needs its own transform per pose. In order of preference:
+    <pose>/MESH_TRANSFORM_NAME, the pose's entry in a `mesh_transform` mapping, or a single
+    `mesh_transform` / the identity, which are only accepted for a single pose (or with
+    `shared_frame`, when all poses really share one frame).
+
+    Returns:
+        np.ndarray: 4x4 matrix, or None for the identity.
+    """
+    pose_name = os.path.basename(os.path.normpath(pose_dir))
+    pose_file = join(pose_dir, MESH_TRANSFORM_NAME)
+    if os.path.exists(pose_file):
+        return load_mesh_transform(pose_file, pose_name)[0]
+    matrix, per_pose = load_mesh_transform(mesh_transform, pose_name) if mesh_transform else (None, False)
+    if per_pose or n_poses == 1 or shared_frame:
+        return matrix
+    raise ValueError(f"No per-pose mesh transform for {pose_name}: the fused mesh cannot be in the frame of "
+                     f"all {n_poses} poses. Add {pose_file}, pass --mesh-transform with a "
+                     f"{{\"{pose_name}\": ...}} mapping, or --shared-frame if the poses really share one frame.")
+
+
+def frame_camera(transforms, frame, scale):
+    """Intrinsics (per frame values override the global ones), scaled to the output resolution."""
+    get = lambda k, default=0.0: float(frame.get(k, transforms.get(k, default)))
+    width = int(round(get("w") * scale))
+    height = int(round(get("h") * scale))
+    return {
+        "width": width, "height": height,
+        "fx": get("fl_x") * scale, "fy": get("fl_y", get("fl_x")) * scale,
+        "cx": get("cx", get("w") / 2) * scale, "cy": get("cy", get("h") / 2) * scale,
+        "k1": get("k1"), "k2": get("k2"), "p1": get("p1"), "p2": get("p2"),
+        "c2w": np.asarray(frame["transform_matrix"], dtype=np.float64),
+    }
+
+
+def project(vertices, cam):
+    """
+    Project world space vertices into pixel coordinates. Cameras follow the nerfstudio /
+    OpenGL convention (looking down -Z, +Y up); OPENCV radial/tangential distortion is applied
+    to the projected vertices.
+
+    Returns:
+        tuple: (uv (N,2) pixel coordinates, depth (N,) distance along the viewing axis)
+    """
+    c2w = cam["c2w"]
+    local = (vertices - c2w[:3, 3]) @ c2w[:3, :3]
+    depth = -local[:, 2]
+    safe = np.where(depth > NEAR_PLANE, depth, np.inf)
+    x, y = local[:, 0] / safe, -local[:, 1] / safe
+    if any(cam[k] for k in ("k1", "k2", "p1", "p2")):
+        r2 = x * x + y * y
+        radial = 1 + cam["k1"] * r2 + cam["k2"] * r2 * r2
+        x, y = (x * radial + 2 * cam["p1"] * x * y + cam["p2"] * (r2 + 2 * x * x),
+                y * radial + cam["p1"] * (r2 + 2 * y * y) + 2 * cam["p2"] * x * y)
+    uv = np.stack([cam["fx"] * x + cam["cx"], cam["fy"] * y + cam["cy"]], axis=1)
+    return uv, depth
+
+
+# =======================
+# Rasterization
+# =======================
+def _shade(tri_uv, tri_z, area, px, py):
+    """
+    Perspective-correct depth of pixel centers (px, py) for each triangle (broadcast over the
+    last axis), inf where the pixel is outside the triangle.
+    """
+    (x0, y0), (x1, y1), (x2, y2) = [(tri_uv[:, i, 0, None], tri_uv[:, i, 1, None]) for i in range(3)]
+    w0 = ((x1 - px) * (y2 - py) - (x2 - px) * (y1 - py)) / area[:, None]
+    w1 = ((x2 - px) * (y0 - py) - (x0 - px) * (y2 - py)) / area[:, None]
+    w2 = 1.0 - w0 - w1
+    inside = (w0 >= 0) & (w1 >= 0) & (w2 >= 0)
+    inv_z = w0 / tri_z[:, 0, None] + w1 / tri_z[:, 1, None] + w2 / tri_z[:, 2, None]
+    return np.where(inside, 1.0 / inv_z, np.inf)
+
+
+def rasterize(uv, depth, faces, width, height):
+    """
+    Z-buffer rasterization of a triangle mesh. Small triangles are rasterized by enumerating the
+    pixels of their bounding box; large ones are binned into TILE_PX tiles and rasterized tile by
+    tile. No backface culling is done, so open meshes still produce filled masks.
+
+    Returns:
+        np.ndarray: (height, width) float32 depth buffer, inf where nothing was hit.
+    """
+    zbuf = np.full(height * width, np.inf, dtype=np.float64)
+    tri_uv, tri_z = uv[faces], depth[faces]
+    lo = np.ceil(tri_uv.min(axis=1) - 0.5)
+    hi = np.floor(tri_uv.max(axis=1) - 0.5)
+    keep = (np.all(np.isfinite(tri_uv), axis=(1, 2)) & np.all(tri_z > NEAR_PLANE, axis=1)
+            & (hi[:, 0] >= 0) & (hi[:, 1] >= 0) & (lo[:, 0] <= width - 1) & (lo[:, 1] <= height - 1)
+            & np.all(hi >= lo, axis=1))
+    tri_uv, tri_z, lo, hi = tri_uv[keep], tri_z[keep], lo[keep], hi[keep]
+    lo = np.maximum(lo, 0).astype(np.int64)
+    hi = np.minimum(hi, [width - 1, height - 1]).astype(np.int64)
+    area = ((tri_uv[:, 1, 0] - tri_uv[:, 0, 0]) * (tri_uv[:, 2, 1] - tri_uv[:, 0, 1])
+            - (tri_uv[:, 2, 0] - tri_uv[:, 0, 0]) * (tri_uv[:, 1, 1] - tri_uv[:, 0, 1]))
+    valid = np.abs(area) > 1e-12
+    tri_uv, tri_z, lo, hi, area = tri_uv[valid], tri_z[valid], lo[valid], hi[valid], area[valid]
+    size = (hi - lo + 1).max(axis=1)
+    small = size <= SMALL_TRIANGLE_PX
+
+    # Small triangles: enumerate a fixed window at each triangle's bbox corner, using
+    # power of two window sizes so tiny triangles don't pay for the largest window
+    window, prev = 1, 0
+    while prev < SMALL_TRIANGLE_PX:
+        window = min(window * 2, SMALL_TRIANGLE_PX)
+        idx = np.nonzero((size > prev) & (size <= window))[0]
+        prev = window
+        off = np.arange(window)
+        ox, oy = [a.ravel() for a in np.meshgrid(off, off)]
+        batch = max(1, MAX_BATCH_ELEMENTS // len(ox))
+        for s in range(0, len(idx), batch):
+            b = idx[s:s + batch]
+            px = lo[b, 0, None] + ox
+            py = lo[b, 1, None] + oy
+            z = _shade(tri_uv[b], tri_z[b], area[b], px + 0.5, py + 0.5)
+            z[(px > hi[b, 0, None]) | (py > hi[b, 1, None])] = np.inf
+            hit = np.isfinite(z)
+            np.minimum.at(zbuf, (py[hit] * width + px[hit]), z[hit])
+
+    # Large triangles: bin into tiles, then shade every pixel of each tile against its triangles
+    idx = np.nonzero(~small)[0]
+    if len(idx):
+        t_lo, t_hi = lo[idx] // TILE_PX, hi[idx] // TILE_PX
+        t_n = t_hi - t_lo + 1
+        counts = t_n[:, 0] * t_n[:, 1]
+        tri = np.repeat(idx, counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        k = np.repeat(np.arange(len(idx)), counts)
+        tx = t_lo[k, 0] + local % t_n[k, 0]
+        ty = t_lo[k, 1] + local // t_n[k, 0]
+        tiles_x = (width + TILE_PX - 1) // TILE_PX
+        tile_id = ty * tiles_x + tx
+        order = np.argsort(tile_id, kind="stable")
+        tile_id, tri = tile_id[order], tri[order]
+        bounds = np.nonzero(np.diff(tile_id))[0] + 1
+        for t_id, tris in zip(tile_id[np.r_[0, bounds]], np.split(tri, bounds)):
+            x0, y0 = (t_id % tiles_x) * TILE_PX, (t_id // tiles_x) * TILE_PX
+            xs = np.arange(x0, min(x0 + TILE_PX, width))
+            ys = np.arange(y0, min(y0 + TILE_PX, height))
+            px, py = [a.ravel() for a in np.meshgrid(xs, ys)]
+            pix = py * width + px
+            batch = max(1, MAX_BATCH_ELEMENTS // len(pix))
+            for s in range(0, len(tris), batch):
+                b = tris[s:s + batch]
+                z = _shade(tri_uv[b], tri_z[b], area[b], px[None, :] + 0.5, py[None, :] + 0.5)
+                zbuf[pix] = np.minimum(zbuf[pix], z.min(axis=0))
+
+    return zbuf.reshape(height, width).astype(np.float32)
+
+
+# =======================
+# Per-frame worker
+# =======================
+_WORKER = {}
+
+
+def _init_worker(vertices, faces, settings):
+    _WORKER.update(vertices=vertices, faces=faces, settings=settings)
+
+
+def _render_frame(job):
+    """Render and save the mask and depth map of one frame. Returns (name, seconds, covered pixels)."""
+    name, cam = job
+    settings = _WORKER["settings"]
+    start = time.time()
+    uv, depth = project(_WORKER["vertices"], cam)
+    zbuf = rasterize(uv, depth, _WORKER["faces"], cam["width"], cam["height"])
+    hit = np.isfinite(zbuf)
+    write_png(join(settings["mask_dir"], f"{name}.png"), hit.astype(np.uint8) * 255)
+    depth_out = np.where(hit, zbuf, 0.0).astype(np.float32)
+    if settings["depth_format"] == "png16":
+        depth_png = np.clip(np.round(depth_out * settings["depth_scale"]), 0, 65535).astype(np.uint16)
+        write_png(join(settings["depth_dir"], f"{name}.png"), depth_png)
+    else:
+        np.save(join(settings["depth_dir"], f"{name}.npy"), depth_out)
+    return name, time.time() - start, int(hit.sum())
+
+
+def find_mesh(object_dir):
+    matches = sorted(glob.glob(join(object_dir, "fused", "*_mesh.ply")))
+    return matches[0] if matches else None
+
+
+def process_pose(pose_dir, vertices, faces, scale=0.25, workers=None, depth_format="npy", depth_scale=1000.0,
+                 max_frames=None, overwrite=False):
+    """
+    Project a mesh into every camera of one pose (transforms.json), writing
+    {pose_dir}/masks/{frame}.png and {pose_dir}/depth/{frame}.npy|png.
+    """
+    with open(join(pose_dir, "transforms.json"), "r") as f:
+        transforms = json.load(f)
+    settings = {
+        "mask_dir": join(pose_dir, "masks"),
+        "depth_dir": join(pose_dir, "depth"),
+        "depth_format": depth_format,
+        "depth_scale": depth_scale,
+    }
+    os.makedirs(settings["mask_dir"], exist_ok=True)
+    os.makedirs(settings["depth_dir"], exist_ok=True)
+
+    jobs = []
+    for frame in transforms["frames"][:max_frames]:
+        name = os.path.splitext(os.path.basename(frame["file_path"]))[0]
+        if not overwrite and os.path.exists(join(settings["mask_dir"], f"{name}.png")):
+            continue
+        jobs.append((name, frame_camera(transforms, frame, scale)))
+    print(f"  {len(jobs)} frames to render ({len(transforms['frames'])} in transforms.json)")
+
+    start = time.time()
+    with Pool(processes=workers, initializer=_init_worker, initargs=(vertices, faces, settings)) as pool:
+        for i, (name, elapsed, covered) in enumerate(pool.imap_unordered(_render_frame, jobs), 1):
+            print(f"  [{i}/{len(jobs)}] {name}: {covered} px in {elapsed:.2f}s", end="\t\t\r")
+    total = time.time() - start
+
+    if jobs:
+        cam = jobs[0][1]
+        meta = {
+            "width": cam["width"], "height": cam["height"], "scale": scale,
+            "depth_format": depth_format,
+            "depth_scale": depth_scale if depth_format == "png16" else 1.0,
+            "depth_units": "transforms.json world units (0 = no hit)",
+        }
+        with open(join(pose_dir, "projection_meta.json"), "w") as f:
+            json.dump(meta, f, indent=4)
+    print(f"\n  ✅ {len(jobs)} frames in {total:.1f}s")
+    return total
+
+
+# === MAIN ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render per-frame object masks and depth maps from a fused mesh and the DSLR camera poses.")
+    parser.add_argument("path", help="Object folder (all pose-* folders) or a single pose folder containing transforms.json")
+    parser.add_argument("--mesh", default=None, help="Mesh to project (default: <object>/fused/*_mesh.ply)")
+    parser.add_argument("--mesh-transform", default=None, help="JSON mapping mesh coordinates to the transforms.json frame, or a {pose: transform} mapping (default: <pose>/mesh_transform.json)")
+    parser.add_argument("--shared-frame", action="store_true", help="Use the same mesh transform (or none) for every pose")
+    parser.add_argument("--scale", type=float, default=0.25, help="Output resolution relative to the DSLR images")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all CPUs)")
+    parser.add_argument("--depth-format", choices=["npy", "png16"], default="npy")
+    parser.add_argument("--depth-scale", type=float, default=1000.0, help="png16 depth = depth * scale")
+    parser.add_argument("--frames", type=int, default=None, help="Only render the first N frames of each pose")
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    path = os.path.abspath(args.path)
+    if os.path.exists(join(path, "transforms.json")):
+        pose_dirs, object_dir = [path], os.path.dirname(path)
+    else:
+        pose_dirs, object_dir = sorted(glob.glob(join(path, "pose-*"))), path
+        pose_dirs = [p for p in pose_dirs if os.path.exists(join(p, "transforms.json"))]
+    if not pose_dirs:
+        print(f"No pose folders with transforms.json found in {path}")
+        sys.exit(1)
+
+    mesh_path = args.mesh or find_mesh(object_dir)
+    if mesh_path is None:
+        print(f"No fused mesh found for {object_dir}, pass one with --mesh")
+        sys.exit(1)
+    print(f"Mesh: {mesh_path}")
+    vertices, _, faces = read_ply(mesh_path)
+    if faces is None:
+        print(f"{mesh_path} has no faces")
+        sys.exit(1)
+    vertices = vertices.astype(np.float64)
+
+    # Resolve every pose's transform before rendering anything. Count the object's poses, not
+    # the ones passed, so a single pose-x of a multi-pose object still needs its own transform
+    n_poses = max(len([p for p in glob.glob(join(object_dir, "pose-*")) if os.path.isdir(p)]), len(pose_dirs))
+    try:
+        matrices = [resolve_pose_transform(p, args.mesh_transform, n_poses, args.shared_frame) for p in pose_dirs]
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    for pose_dir, matrix in zip(pose_dirs, matrices):
+        print(f"\n📷 {pose_dir}")
+        pose_vertices = vertices if matrix is None else vertices @ matrix[:3, :3].T + matrix[:3, 3]
+        process_pose(pose_dir, pose_vertices, faces, scale=args.scale, workers=args.workers,
+                     depth_format=args.depth_format, depth_scale=args.depth_scale,
+                     max_frames=args.frames, overwrite=args.overwrite)
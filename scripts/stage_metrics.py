@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import time
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Output formats: one JSON object per stage, or one OTLP/JSON (OpenTelemetry) export request per stage span
+FORMAT_JSONL = "jsonl"
+FORMAT_OTEL = "otel"
+OTEL_SERVICE_NAME = "moad-pipeline"
+OTEL_SCOPE_NAME = "moad.stage_metrics"
+
+
+def _reset_peak_rss():
+    """Reset the kernel's peak RSS counter (Linux only) so VmHWM reflects the current stage."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    """Peak resident set size in MB (since the last reset where supported)."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    if resource is None:
+        return 0.0
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, KB on Linux
+    return maxrss / (1024.0 * 1024.0) if sys.platform == "darwin" else maxrss / 1024.0
+
+
+def _otel_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _from_otel_value(value):
+    kind, v = next(iter(value.items()))
+    return int(v) if kind == "intValue" else v
+
+
+class StageRecorder:
+    """
+    Records wall time, CPU time, peak memory and arbitrary size attributes for named
+    processing stages of one object, appending a record per stage to `output_path`.
+
+    Usage:
+        recorder = StageRecorder("atb1_gear-large", "stage_metrics.jsonl")
+        with recorder.stage("decimate", vertices_in=n) as span:
+            ...
+            span["vertices_out"] = m
+        recorder.close()
+    """
+    def __init__(self, object_name, output_path, fmt=FORMAT_JSONL):
+        if fmt not in (FORMAT_JSONL, FORMAT_OTEL):
+            raise ValueError(f"Unknown metrics format: {fmt}")
+        self.object_name = object_name
+        self.output_path = output_path
+        self.fmt = fmt
+        self.trace_id = os.urandom(16).hex()
+        self.root_span_id = os.urandom(8).hex()
+        self.start_ns = time.time_ns()
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.records = []
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        # Truncate any metrics from a previous run of the same object
+        open(output_path, "w").close()
+
+    def _write(self, record):
+        with open(self.output_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _span(self, name, span_id, parent_id, start_ns, end_ns, attributes, ok):
+        """One span wrapped in an OTLP/JSON ExportTraceServiceRequest, with the object as a resource attribute."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": span_id,
+            "parentSpanId": parent_id or "",
+            "name": name,
+            "kind": 1,
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(end_ns),
+            "attributes": [{"key": k, "value": _otel_value(v)} for k, v in attributes.items()],
+            "status": {"code": 1 if ok else 2},
+        }
+        resource = {"service.name": OTEL_SERVICE_NAME, "moad.object": self.object_name}
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": k, "value": _otel_value(v)} for k, v in resource.items()]},
+            "scopeSpans": [{"scope": {"name": OTEL_SCOPE_NAME}, "spans": [span]}],
+        }]}
+
+    @contextmanager
+    def stage(self, name, **attributes):
+        """
+        Time a named stage. Yields a dict of attributes which the caller may extend
+        (e.g. with output vertex/face counts) before the stage ends.
+        """
+        attributes = dict(attributes)
+        peak_reset = _reset_peak_rss()
+        start_ns = time.time_ns()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        ok = True
+        try:
+            yield attributes
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            record = {
+                "object": self.object_name,
+                "stage": name,
+                "start": start_ns / 1e9,
+                "wall_s": time.perf_counter() - start_wall,
+                "cpu_s": time.process_time() - start_cpu,
+                "peak_rss_mb": _peak_rss_mb(),
+                "peak_rss_is_stage_local": peak_reset,
+                "status": "ok" if ok else "error",
+                "attributes": attributes,
+            }
+            self.records.append(record)
+            if self.fmt == FORMAT_OTEL:
+                span_attrs = {"moad.wall_s": record["wall_s"], "moad.cpu_s": record["cpu_s"],
+                              "moad.peak_rss_mb": record["peak_rss_mb"]}
+                span_attrs.update(attributes)
+                self._write(self._span(name, os.urandom(8).hex(), self.root_span_id,
+                                       start_ns, time.time_ns(), span_attrs, ok))
+            else:
+                self._write(record)
+
+    def close(self):
+        """Write the per-object root span / total record."""
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.process_time() - self.start_cpu
+        ok = all(r["status"] == "ok" for r in self.records)
+        # The peak counter is reset before every stage, so the whole-run peak is the largest stage peak
+        peak = max([r["peak_rss_mb"] for r in self.records] + [_peak_rss_mb()])
+        if self.fmt == FORMAT_OTEL:
+            self._write(self._span(self.object_name, self.root_span_id, None, self.start_ns, time.time_ns(),
+                                   {"moad.wall_s": wall, "moad.cpu_s": cpu, "moad.peak_rss_mb": peak}, ok))
+        else:
+            self._write({"object": self.object_name, "stage": "total", "start": self.start_ns / 1e9,
+                         "wall_s": wall, "cpu_s": cpu, "peak_rss_mb": peak,
+                         "status": "ok" if ok else "error", "attributes": {}})
+
+
+def load_stage_records(path):
+    """
+    Load stage records from a JSON lines metrics file written by StageRecorder
+    (either format), normalized to the plain jsonl record layout.
+    """
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "resourceSpans" in record:
+                for resource_spans in record["resourceSpans"]:
+                    resource = _otel_attributes(resource_spans.get("resource", {}).get("attributes", []))
+                    for scope_spans in resource_spans.get("scopeSpans", []):
+                        for span in scope_spans.get("spans", []):
+                            records.append(_record_from_span(span, resource.get("moad.object")))
+            elif "traceId" in record:  # bare span, as written by earlier versions
+                records.append(_record_from_span(record))
+            else:
+                records.append(record)
+    return records
+
+
+def _otel_attributes(attributes):
+    return {a["key"]: _from_otel_value(a["value"]) for a in attributes}
+
+
+def _record_from_span(span, object_name=None):
+    """Convert a StageRecorder span to the plain jsonl record layout."""
+    attrs = _otel_attributes(span["attributes"])
+    object_name = attrs.pop("moad.object", object_name)
+    return {
+        "object": object_name,
+        "stage": "total" if not span["parentSpanId"] else span["name"],
+        "start": int(span["startTimeUnixNano"]) / 1e9,
+        "wall_s": float(attrs.pop("moad.wall_s")),
+        "cpu_s": float(attrs.pop("moad.cpu_s")),
+        "peak_rss_mb": float(attrs.pop("moad.peak_rss_mb", 0.0)),
+        "status": "ok" if span["status"]["code"] != 2 else "error",
+        "attributes": attrs,
+    }
+
+
+def summarize_stages(records):
+    """
+    Aggregate stage records (from any number of objects) into per-stage statistics.
+
+    Returns:
+        dict: stage name -> {count, errors, wall/cpu totals, means and maxima, peak memory,
+        and the stage's share of the summed wall time of all stages}
+    """
+    summary = {}
+    for r in records:
+        if r["stage"] == "total":
+            continue
+        s = summary.setdefault(r["stage"], {"count": 0, "errors": 0, "wall_total_s": 0.0, "wall_max_s": 0.0,
+                                            "cpu_total_s": 0.0, "peak_rss_max_mb": 0.0, "slowest_object": None})
+        s["count"] += 1
+        s["errors"] += r["status"] != "ok"
+        s["wall_total_s"] += r["wall_s"]
+        s["cpu_total_s"] += r["cpu_s"]
+        s["peak_rss_max_mb"] = max(s["peak_rss_max_mb"], r["peak_rss_mb"])
+        if r["wall_s"] >= s["wall_max_s"]:
+            s["wall_max_s"] = r["wall_s"]
+            s["slowest_object"] = r["object"]
+    all_wall = sum(s["wall_total_s"] for s in summary.values()) or 1.0
+    for s in summary.values():
+        s["wall_mean_s"] = s["wall_total_s"] / s["count"]
+        s["cpu_mean_s"] = s["cpu_total_s"] / s["count"]
+        s["wall_share"] = s["wall_total_s"] / all_wall
+    return summary
+
+
+def print_stage_summary(summary):
+    """Print a per-stage summary table, slowest stages first."""
+    print(f"{'Stage':<20}{'Count':>7}{'Total (s)':>12}{'Mean (s)':>11}{'Max (s)':>10}{'CPU (s)':>10}{'Peak MB':>10}{'Share':>8}")
+    for name, s in sorted(summary.items(), key=lambda kv: -kv[1]["wall_total_s"]):
+        print(f"{name:<20}{s['count']:>7}{s['wall_total_s']:>12.2f}{s['wall_mean_s']:>11.2f}{s['wall_max_s']:>10.2f}"
+              f"{s['cpu_total_s']:>10.2f}{s['peak_rss_max_mb']:>10.0f}{s['wall_share']:>8.1%}")
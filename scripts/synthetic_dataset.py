@@ -0,0 +1,279 @@
+import os
+import json
+import bisect
+import shutil
+import hashlib
+import struct
+import time
+import numpy as np
+
+from mesh_io import write_ply
+
+
+# =======================
+# Synthetic geometry
+# =======================
+def make_blob_mesh(n_faces, radius=0.05, loose_parts=4, seed=0):
+    """
+    Create a noisy closed 'blob' mesh (a perturbed UV sphere) with roughly `n_faces` triangles,
+    plus a few small floating fragments so that loose part removal has something to do.
+
+    Returns:
+        tuple: (vertices (N,3) float32, colors (N,3) uint8, faces (F,3) int32)
+    """
+    rng = np.random.default_rng(seed)
+    n = max(4, int(np.sqrt(n_faces / 2.0)))
+    n_lat, n_lon = n, n
+    lat = np.linspace(0, np.pi, n_lat + 1)[1:-1]
+    lon = np.linspace(0, 2 * np.pi, n_lon, endpoint=False)
+    lat, lon = np.meshgrid(lat, lon, indexing="ij")
+    r = radius * (1.0 + 0.15 * np.sin(3 * lon) * np.sin(2 * lat) + 0.01 * rng.standard_normal(lat.shape))
+    ring = np.stack([r * np.sin(lat) * np.cos(lon), r * np.sin(lat) * np.sin(lon), r * np.cos(lat)], axis=-1)
+    vertices = np.concatenate([[[0, 0, radius]], ring.reshape(-1, 3), [[0, 0, -radius]]]).astype(np.float32)
+
+    # Quads between rings, triangle fans at the poles
+    faces = []
+    top, bottom = 0, len(vertices) - 1
+    idx = np.arange(1, 1 + (n_lat - 1) * n_lon).reshape(n_lat - 1, n_lon)
+    nxt = np.roll(idx, -1, axis=1)
+    faces.append(np.stack([np.full(n_lon, top), idx[0], nxt[0]], axis=1))
+    a, b, c, d = idx[:-1], nxt[:-1], idx[1:], nxt[1:]
+    faces.append(np.stack([a, c, b], axis=-1).reshape(-1, 3))
+    faces.append(np.stack([b, c, d], axis=-1).reshape(-1, 3))
+    faces.append(np.stack([np.full(n_lon, bottom), nxt[-1], idx[-1]], axis=1))
+    faces = np.concatenate(faces).astype(np.int32)
+
+    # Floating fragments (tetrahedra) around the main body
+    tet = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]], dtype=np.float32) * radius * 0.05
+    tet_faces = np.array([[0, 2, 1], [0, 1, 3], [0, 3, 2], [1, 2, 3]], dtype=np.int32)
+    for _ in range(loose_parts):
+        offset = rng.uniform(-2 * radius, 2 * radius, size=3).astype(np.float32)
+        faces = np.concatenate([faces, tet_faces + len(vertices)])
+        vertices = np.concatenate([vertices, tet + offset])
+
+    colors = (127 + 127 * np.tanh(vertices / radius)).astype(np.uint8)
+    return vertices, colors, faces
+
+
+def make_cloud(n_points, radius=0.05, seed=0):
+    """Sample a noisy colored point cloud on the surface of a perturbed sphere."""
+    rng = np.random.default_rng(seed)
+    direction = rng.standard_normal((n_points, 3))
+    direction /= np.linalg.norm(direction, axis=1, keepdims=True)
+    r = radius * (1.0 + 0.01 * rng.standard_normal((n_points, 1)))
+    points = (direction * r).astype(np.float32)
+    colors = rng.integers(0, 256, size=(n_points, 3), dtype=np.uint8)
+    return points, colors
+
+
+def make_transforms(n_frames, width=6000, height=4000, focal=9000.0, radius=0.5, image_dir="DSLR"):
+    """
+    Create a transforms.json style dict with cameras on a ring looking at the origin.
+    Camera-to-world matrices use the OpenGL convention (camera looks down -Z, +Y up).
+    """
+    frames = []
+    for i in range(n_frames):
+        theta = 2 * np.pi * i / n_frames
+        elevation = 0.35 * np.sin(4 * theta)
+        eye = radius * np.array([np.cos(theta) * np.cos(elevation), np.sin(theta) * np.cos(elevation), np.sin(elevation)])
+        forward = -eye / np.linalg.norm(eye)
+        right = np.cross(forward, [0, 0, 1])
+        right /= np.linalg.norm(right)
+        up = np.cross(right, forward)
+        c2w = np.eye(4)
+        c2w[:3, 0], c2w[:3, 1], c2w[:3, 2], c2w[:3, 3] = right, up, -forward, eye
+        frames.append({"file_path": f"{image_dir}/IMG_{i:04d}.JPG", "transform_matrix": c2w.tolist()})
+    return {
+        "camera_model": "OPENCV",
+        "fl_x": focal, "fl_y": focal,
+        "cx": width / 2.0, "cy": height / 2.0,
+        "w": width, "h": height,
+        "k1": 0.0, "k2": 0.0, "p1": 0.0, "p2": 0.0,
+        "frames": frames,
+    }
+
+
+def write_obj(path, vertices, faces):
+    """Write a minimal Wavefront OBJ (positions and triangles only)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        np.savetxt(f, vertices, fmt="v %.6f %.6f %.6f")
+        np.savetxt(f, faces + 1, fmt="f %d %d %d")
+
+
+def write_stl(path, vertices, faces):
+    """Write a binary STL file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tri = vertices[faces].astype(np.float32)
+    normals = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    normals /= np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-12)
+    record = np.zeros(len(faces), dtype=np.dtype([("n", "<f4", (3,)), ("v", "<f4", (3, 3)), ("attr", "<u2")]))
+    record["n"] = normals
+    record["v"] = tri
+    with open(path, "wb") as f:
+        f.write(b"synthetic MOADv2 CAD UNITS=mm".ljust(80, b" "))
+        f.write(struct.pack("<I", len(faces)))
+        f.write(record.tobytes())
+
+
+def generate_object(bucket_root, obj_name, poses=("pose-a", "pose-b"), dslr_images=360, image_kb=64,
+                    realsense_clouds=360, realsense_points=2000, export_points=100000,
+                    cloud_points=200000, mesh_faces=200000, seed=0):
+    """
+    Write one synthetic object into `bucket_root` using the same layout as the MOADv2 S3 bucket:
+        {obj}/pose-x/DSLR/, {obj}/pose-x/realsense/, {obj}/pose-x/exports/,
+        {obj}/pose-x/camera_config.json, {obj}/pose-x/transforms.json,
+        {obj}/cad/, {obj}/fused/
+    """
+    rng = np.random.default_rng(seed)
+    obj_root = os.path.join(bucket_root, obj_name)
+    for p_i, pose in enumerate(poses):
+        pose_root = os.path.join(obj_root, pose)
+        dslr_dir = os.path.join(pose_root, "DSLR")
+        os.makedirs(dslr_dir, exist_ok=True)
+        transforms = make_transforms(dslr_images)
+        for frame in transforms["frames"]:
+            with open(os.path.join(pose_root, frame["file_path"]), "wb") as f:
+                f.write(rng.bytes(image_kb * 1024))
+        with open(os.path.join(pose_root, "transforms.json"), "w") as f:
+            json.dump(transforms, f, indent=4)
+        with open(os.path.join(pose_root, "camera_config.json"), "w") as f:
+            json.dump({"camera": "synthetic", "resolution": [transforms["w"], transforms["h"]],
+                       "iso": 100, "shutter": "1/60", "aperture": 8.0}, f, indent=4)
+
+        for i in range(realsense_clouds):
+            points, colors = make_cloud(realsense_points, seed=seed * 1000 + p_i * 100000 + i)
+            write_ply(os.path.join(pose_root, "realsense", f"cloud_{i:04d}.ply"), points, colors)
+
+        points, colors = make_cloud(export_points, seed=seed * 1000 + p_i)
+        write_ply(os.path.join(pose_root, "exports", "point_cloud.ply"), points, colors)
+
+    vertices, colors, faces = make_blob_mesh(mesh_faces, seed=seed)
+    write_stl(os.path.join(obj_root, "cad", f"{obj_name}.stl"), vertices * 1000.0, faces)
+
+    fused_root = os.path.join(obj_root, "fused")
+    points, cloud_colors = make_cloud(cloud_points, seed=seed)
+    write_ply(os.path.join(fused_root, f"{obj_name}_cloud.ply"), points, cloud_colors)
+    write_ply(os.path.join(fused_root, f"{obj_name}_mesh.ply"), vertices, colors, faces)
+    write_obj(os.path.join(fused_root, "obj", "fused_model.obj"), vertices * 0.814, faces)
+    with open(os.path.join(fused_root, "baked_texture.png"), "wb") as f:
+        f.write(rng.bytes(16 * 1024))
+    return obj_root
+
+
+def generate_dataset(bucket_root, n_objects=3, prefix="synth", **kwargs):
+    """Generate `n_objects` synthetic objects. Returns the list of object names."""
+    names = []
+    for i in range(n_objects):
+        name = f"{prefix}_object-{i:02d}"
+        generate_object(bucket_root, name, seed=i, **kwargs)
+        names.append(name)
+    return names
+
+
+# =======================
+# Local fake S3 client
+# =======================
+class LocalS3Client:
+    """
+    Minimal stand-in for a boto3 S3 client backed by a local directory (the bucket root).
+    Implements the calls used by MOADv2_Downloader, with optional simulated per-request
+    latency and per-connection bandwidth so that concurrency effects can be measured.
+    """
+    def __init__(self, root, latency=0.0, bandwidth_mbps=None):
+        self.root = os.path.abspath(root)
+        self.latency = latency
+        self.bandwidth = bandwidth_mbps * 1e6 / 8.0 if bandwidth_mbps else None
+        self._etags = {}
+        self.keys = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                rel = os.path.relpath(os.path.join(dirpath, name), self.root)
+                self.keys.append(rel.replace(os.sep, "/"))
+        self.keys.sort()
+        self.request_count = 0
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def _etag(self, key):
+        if key not in self._etags:
+            md5 = hashlib.md5()
+            with open(self._path(key), "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    md5.update(block)
+            self._etags[key] = f'"{md5.hexdigest()}"'
+        return self._etags[key]
+
+    def _request(self, nbytes=0):
+        self.request_count += 1
+        delay = self.latency
+        if self.bandwidth:
+            delay += nbytes / self.bandwidth
+        if delay > 0:
+            time.sleep(delay)
+
+    def list_objects_v2(self, Bucket, Prefix="", Delimiter=None, MaxKeys=1000, ContinuationToken=None, **kwargs):
+        self._request()
+        start = bisect.bisect_left(self.keys, ContinuationToken or Prefix)
+        contents, prefixes, seen = [], [], set()
+        response = {"IsTruncated": False, "KeyCount": 0}
+        i = start
+        while i < len(self.keys) and self.keys[i].startswith(Prefix):
+            key = self.keys[i]
+            remainder = key[len(Prefix):]
+            if Delimiter and Delimiter in remainder:
+                common = Prefix + remainder.split(Delimiter)[0] + Delimiter
+                if common not in seen:
+                    if len(contents) + len(prefixes) >= MaxKeys:
+                        break
+                    seen.add(common)
+                    prefixes.append({"Prefix": common})
+                # Jump past everything under this common prefix
+                i = bisect.bisect_left(self.keys, common + "\uffff")
+                continue
+            if len(contents) + len(prefixes) >= MaxKeys:
+                break
+            contents.append({"Key": key, "Size": os.path.getsize(self._path(key)), "ETag": self._etag(key)})
+            i += 1
+        if i < len(self.keys) and self.keys[i].startswith(Prefix):
+            response["IsTruncated"] = True
+            response["NextContinuationToken"] = self.keys[i]
+        if contents:
+            response["Contents"] = contents
+        if prefixes:
+            response["CommonPrefixes"] = prefixes
+        response["KeyCount"] = len(contents) + len(prefixes)
+        return response
+
+    def head_object(self, Bucket, Key):
+        self._request()
+        return {"ContentLength": os.path.getsize(self._path(Key)), "ETag": self._etag(Key)}
+
+    def download_file(self, Bucket, Key, Filename):
+        src = self._path(Key)
+        if not os.path.isfile(src):
+            raise FileNotFoundError(f"s3://{Bucket}/{Key}")
+        self._request(os.path.getsize(src))
+        tmp = f"{Filename}.part"
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, Filename)
+
+    def get_paginator(self, operation_name):
+        if operation_name != "list_objects_v2":
+            raise NotImplementedError(operation_name)
+        return _ListObjectsPaginator(self)
+
+
+class _ListObjectsPaginator:
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, **kwargs):
+        token = None
+        while True:
+            page = self.client.list_objects_v2(ContinuationToken=token, **kwargs)
+            yield page
+            if not page["IsTruncated"]:
+                break
+            token = page["NextContinuationToken"]